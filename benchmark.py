@@ -0,0 +1,733 @@
+import argparse
+import asyncio
+import ctypes
+import gc
+import json
+import multiprocessing
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+from sklearn.neighbors import KNeighborsRegressor
+from sklearn.preprocessing import LabelEncoder, StandardScaler
+
+from preditor import EnemKNNPredictor
+from gerador_sintetico import gerar_bloco, gerar_csv_sintetico
+
+
+def perfis_aleatorios(n, semente=1):
+    """
+    Gera perfis de entrada no formato usado por prever_notas, sorteados com a mesma
+    distribuição dos dados sintéticos (valores ausentes viram 'nan', como na carga)
+    """
+    colunas = ['TP_COR_RACA', 'TP_ESCOLA', 'TP_ENSINO', 'SG_UF_ESC',
+               'TP_DEPENDENCIA_ADM_ESC', 'TP_LOCALIZACAO_ESC']
+    bloco = gerar_bloco(np.random.default_rng(semente), n)
+    return [{coluna: 'nan' if pd.isna(valor) else str(valor) for coluna, valor in zip(colunas, linha)}
+            for linha in bloco[colunas].itertuples(index=False)]
+
+
+def prever_por_alvo(predictor, modelos, dados_entrada):
+    """
+    Caminho antigo: um KNeighborsRegressor por coluna alvo, com predict e kneighbors separados
+    """
+    dados_processados = [predictor.label_encoders[c].transform([dados_entrada[c]])[0]
+                         for c in predictor.colunas_categoricas]
+    dados_normalizados = predictor.scaler.transform([dados_processados])
+    previsoes = {}
+    for i, coluna_alvo in enumerate(predictor.colunas_alvo):
+        model = modelos[coluna_alvo]
+        previsoes[coluna_alvo] = model.predict(dados_normalizados)[0]
+        vizinhos_indices = model.kneighbors(dados_normalizados, return_distance=False)[0]
+        previsoes[f"{coluna_alvo}_vizinhos"] = predictor.notas[i, vizinhos_indices].astype(np.float64)
+    return previsoes
+
+
+def benchmark_busca_compartilhada(n_linhas, k, n_consultas):
+    """
+    Compara o caminho antigo (cinco modelos) com a busca única multi-alvo de prever_notas
+    """
+    with tempfile.TemporaryDirectory() as pasta:
+        arquivo = os.path.join(pasta, "enem_sintetico.csv")
+        gerar_csv_sintetico(arquivo, n_linhas)
+
+        # Sem o cache de previsões: perfis repetidos não podem virar acertos do cache
+        predictor = EnemKNNPredictor(arquivo, tamanho_cache_previsoes=0)
+        predictor.carregar_dados()
+        predictor.preparar_modelo(k=k)
+
+        X = predictor.scaler.transform(predictor.codigos.astype(np.float64))
+        modelos = {}
+        for i, coluna_alvo in enumerate(predictor.colunas_alvo):
+            y = predictor.notas[i].astype(np.float64)
+            modelos[coluna_alvo] = KNeighborsRegressor(n_neighbors=k).fit(X, y)
+
+        perfis = perfis_aleatorios(n_consultas)
+
+        inicio = time.perf_counter()
+        antigas = [prever_por_alvo(predictor, modelos, p) for p in perfis]
+        tempo_antigo = time.perf_counter() - inicio
+
+        inicio = time.perf_counter()
+        novas = [predictor.prever_notas(p) for p in perfis]
+        tempo_novo = time.perf_counter() - inicio
+
+    identicas = all(
+        np.array_equal(np.asarray(a[c]), np.asarray(b[c]))
+        for a, b in zip(antigas, novas) for c in a
+    )
+    print(f"Registros: {n_linhas} | K: {k} | Consultas: {n_consultas}")
+    print(f"Cinco modelos:       {1000 * tempo_antigo / n_consultas:.3f} ms/consulta")
+    print(f"Busca compartilhada: {1000 * tempo_novo / n_consultas:.3f} ms/consulta")
+    print(f"Ganho: {tempo_antigo / tempo_novo:.1f}x | Resultados idênticos: {identicas}")
+    return identicas
+
+
+def normalizar_perfis(predictor, perfis):
+    """
+    Codifica e normaliza perfis de entrada com os encoders e o scaler do preditor
+    """
+    codigos = [[predictor.label_encoders[c].transform([p[c]])[0] for c in predictor.colunas_categoricas]
+               for p in perfis]
+    return predictor.scaler.transform(np.asarray(codigos, dtype=np.float64))
+
+
+def vizinhos_exaustivos(X_treino, x, k):
+    """
+    Referência exaustiva: distância de x a todos os registros, com desempate pelas
+    coordenadas (ordem lexicográfica, como os perfis do MotorPerfis) e depois pela ordem
+    do arquivo. Retorna os índices dos K vizinhos e as distâncias de todos os registros
+    """
+    distancias = np.sqrt(((X_treino - x) ** 2).sum(axis=1))
+    limite = np.partition(distancias, k - 1)[k - 1]
+    candidatos = np.flatnonzero(distancias <= limite)
+    chaves = [candidatos] + [X_treino[candidatos, j] for j in reversed(range(X_treino.shape[1]))]
+    ordem = np.lexsort(chaves + [distancias[candidatos]])
+    return candidatos[ordem[:k]], distancias
+
+
+def verificar_paridade(n_linhas, valores_k, n_consultas):
+    """
+    Confere os motores com uma busca exaustiva sobre todos os registros.
+    Como os perfis categóricos quase sempre empatam no K-ésimo vizinho, a comparação não
+    depende de como cada motor desempata: o motor de perfis, cujo critério de desempate é
+    definido, deve reproduzir exatamente os vizinhos e as previsões da referência; o motor
+    fragmentado (em 3 processos, para que a divisão das linhas importe) deve reproduzir a
+    referência ordenada por distância e posição do registro; no motor de índice, as
+    distâncias dos K vizinhos devem ser as da referência e todos os registros estritamente
+    mais próximos que o K-ésimo devem estar entre os vizinhos
+    """
+    with tempfile.TemporaryDirectory() as pasta:
+        arquivo = os.path.join(pasta, "enem_sintetico.csv")
+        gerar_csv_sintetico(arquivo, n_linhas)
+
+        preditores = {}
+        for motor in EnemKNNPredictor.MOTORES:
+            predictor = EnemKNNPredictor(arquivo, motor=motor, n_processos=3)
+            predictor.carregar_dados()
+            preditores[motor] = predictor
+
+    referencia = preditores['indice']
+    features = tuple(referencia.colunas_categoricas)
+    referencia.preparar_modelo(k=valores_k[0])
+    X_treino = referencia.scaler.transform(referencia.codigos.astype(np.float64))
+    notas = referencia.notas.astype(np.float64)
+    ok = True
+    for k in valores_k:
+        modelos = {}
+        tempos = {}
+        for motor, predictor in preditores.items():
+            predictor.preparar_modelo(k=k)
+            modelos[motor] = predictor.models[(features, k, None)]
+
+        X = normalizar_perfis(referencia, perfis_aleatorios(n_consultas))
+        vizinhos_ref = []
+        posicao_ref = []
+        distancias_ref = []
+        proximos_ref = []
+        empatadas = 0
+        for x in X:
+            vizinhos, distancias = vizinhos_exaustivos(X_treino, x, k)
+            vizinhos_ref.append(vizinhos)
+            candidatos = np.flatnonzero(distancias <= distancias[vizinhos[-1]])
+            posicao_ref.append(candidatos[np.lexsort((candidatos, distancias[candidatos]))[:k]])
+            distancias_ref.append(distancias[vizinhos])
+            proximos_ref.append(np.flatnonzero(distancias < distancias[vizinhos[-1]]))
+            empatadas += np.count_nonzero(distancias <= distancias[vizinhos[-1]]) > k
+        vizinhos_ref = np.array(vizinhos_ref)
+        posicao_ref = np.array(posicao_ref)
+        distancias_ref = np.array(distancias_ref)
+        previsoes_ref = np.mean(notas[:, vizinhos_ref], axis=2).T
+
+        resultados = []
+        for motor, modelo in modelos.items():
+            inicio = time.perf_counter()
+            previsoes = modelo.predict(X)
+            tempos[motor] = time.perf_counter() - inicio
+            distancias, vizinhos = modelo.kneighbors(X)
+
+            distancias_ok = np.allclose(distancias, distancias_ref)
+            proximos_ok = all(np.isin(proximos, linha).all() for proximos, linha in zip(proximos_ref, vizinhos))
+            if motor == 'perfis':
+                exatos = np.array_equal(vizinhos, vizinhos_ref) and np.allclose(previsoes, previsoes_ref)
+            elif motor == 'fragmentado':
+                exatos = (np.array_equal(vizinhos, posicao_ref)
+                          and np.allclose(previsoes, np.mean(notas[:, posicao_ref], axis=2).T))
+            else:
+                exatos = True
+            ok = ok and distancias_ok and proximos_ok and exatos
+            resultados.append(f"{motor} {'ok' if distancias_ok and proximos_ok and exatos else 'DIFERENTE'} "
+                              f"({1000 * tempos[motor] / n_consultas:.3f} ms/consulta)")
+
+        print(f"K={k}: {empatadas}/{n_consultas} consultas empatam no K-ésimo vizinho | "
+              + " | ".join(resultados))
+
+    memoria_sk = preditores['indice'].indices[(features, None)][1].bytes_ocupados()
+    memoria_perfis = preditores['perfis'].indices[(features, None)][1].bytes_ocupados()
+    print(f"Memória do índice: sklearn {memoria_sk / 2 ** 20:.1f} MiB | "
+          f"perfis {memoria_perfis / 2 ** 20:.1f} MiB")
+    return ok
+
+
+def benchmark_fragmentado(n_linhas, k, n_consultas, valores_processos):
+    """
+    Vazão da previsão em lote com o motor fragmentado para diferentes números de processos
+    """
+    with tempfile.TemporaryDirectory() as pasta:
+        arquivo = os.path.join(pasta, "enem_sintetico.csv")
+        gerar_csv_sintetico(arquivo, n_linhas)
+        perfis = pd.DataFrame(perfis_aleatorios(n_consultas))
+
+        for n_processos in valores_processos:
+            motor = 'indice' if n_processos == 0 else 'fragmentado'
+            predictor = EnemKNNPredictor(arquivo, motor=motor, n_processos=n_processos or None)
+            predictor.carregar_dados()
+            predictor.preparar_modelo(k=k)
+            predictor.prever_lote(perfis.head(10))
+
+            inicio = time.perf_counter()
+            predictor.prever_lote(perfis)
+            tempo = time.perf_counter() - inicio
+            predictor.invalidar_modelos()
+
+            rotulo = "índice único" if n_processos == 0 else f"{n_processos} processo(s)"
+            print(f"Motor fragmentado, {rotulo}: {n_consultas / tempo:.0f} perfis/s")
+
+
+async def _carga_servidor(porta, perfis, n_conexoes, n_requisicoes):
+    """
+    Dispara requisições POST /prever com conexões keep-alive concorrentes e mede a latência
+    """
+    latencias = []
+
+    async def cliente(indices):
+        leitor, escritor = await asyncio.open_connection('127.0.0.1', porta)
+        for i in indices:
+            corpo = json.dumps(perfis[i % len(perfis)]).encode('utf-8')
+            inicio = time.perf_counter()
+            escritor.write(f"POST /prever HTTP/1.1\r\nHost: localhost\r\n"
+                           f"Content-Length: {len(corpo)}\r\n\r\n".encode('latin1') + corpo)
+            await escritor.drain()
+            tamanho = 0
+            while True:
+                linha = await leitor.readline()
+                if linha == b'\r\n':
+                    break
+                if linha.lower().startswith(b'content-length:'):
+                    tamanho = int(linha.split(b':')[1])
+            await leitor.readexactly(tamanho)
+            latencias.append(time.perf_counter() - inicio)
+        escritor.close()
+
+    inicio = time.perf_counter()
+    await asyncio.gather(*[cliente(range(c, n_requisicoes, n_conexoes)) for c in range(n_conexoes)])
+    return time.perf_counter() - inicio, np.array(latencias)
+
+
+def benchmark_servidor(n_linhas, k, n_requisicoes, n_conexoes=64, porta=8765):
+    """
+    Vazão e latência (p50/p99) do servidor HTTP com agrupamento de requisições
+    """
+    from servidor import ServidorPrevisoes
+
+    with tempfile.TemporaryDirectory() as pasta:
+        arquivo = os.path.join(pasta, "enem_sintetico.csv")
+        gerar_csv_sintetico(arquivo, n_linhas)
+        predictor = EnemKNNPredictor(arquivo)
+        predictor.carregar_dados()
+        predictor.preparar_modelo(k=k)
+
+    servidor = ServidorPrevisoes(predictor, k_padrao=k)
+
+    async def executar():
+        servidor_http = await servidor.iniciar('127.0.0.1', porta)
+        async with servidor_http:
+            return await _carga_servidor(porta, perfis_aleatorios(1000), n_conexoes, n_requisicoes)
+
+    tempo, latencias = asyncio.run(executar())
+    print(f"Servidor: {n_requisicoes} requisições, {n_conexoes} conexões | "
+          f"{n_requisicoes / tempo:.0f} previsões/s | "
+          f"p50 {1000 * np.percentile(latencias, 50):.1f} ms | p99 {1000 * np.percentile(latencias, 99):.1f} ms | "
+          f"{servidor.lotes} lotes")
+
+
+def _carregar_snapshot_em_processo(pasta, perfis, motor):
+    """
+    Executado num processo novo: carrega o snapshot, prevê os perfis e mede a memória.
+    Pss divide as páginas compartilhadas entre os processos que as mapeiam
+    """
+    inicio = time.perf_counter()
+    predictor = EnemKNNPredictor('', motor=motor)
+    predictor.carregar_snapshot(pasta)
+    tempo = time.perf_counter() - inicio
+    previsoes = predictor.prever_lote(pd.DataFrame(perfis))
+    memoria = {}
+    if os.path.exists('/proc/self/smaps_rollup'):
+        with open('/proc/self/smaps_rollup') as f:
+            for linha in f:
+                nome, _, valor = linha.partition(':')
+                if nome in ('Rss', 'Pss'):
+                    memoria[nome] = int(valor.split()[0]) / 1024
+    return tempo, previsoes, memoria
+
+
+def benchmark_snapshot(n_linhas, k, n_consultas, n_processos=4):
+    """
+    Tempo de preparação a partir do CSV contra o carregamento de um snapshot em vários
+    processos novos, conferindo que as previsões são as mesmas
+    """
+    ok = True
+    perfis = perfis_aleatorios(n_consultas)
+    contexto = multiprocessing.get_context('spawn')
+    with tempfile.TemporaryDirectory() as pasta:
+        arquivo = os.path.join(pasta, "enem_sintetico.csv")
+        gerar_csv_sintetico(arquivo, n_linhas)
+
+        for motor in ['indice', 'perfis']:
+            inicio = time.perf_counter()
+            predictor = EnemKNNPredictor(arquivo, motor=motor, usar_cache=False)
+            predictor.carregar_dados()
+            predictor.preparar_modelo(k=k)
+            tempo_csv = time.perf_counter() - inicio
+            esperado = predictor.prever_lote(pd.DataFrame(perfis))
+
+            pasta_snapshot = os.path.join(pasta, f"snapshot_{motor}")
+            predictor.salvar_snapshot(pasta_snapshot)
+            predictor.invalidar_modelos()
+
+            with ProcessPoolExecutor(n_processos, mp_context=contexto) as executor:
+                resultados = list(executor.map(_carregar_snapshot_em_processo,
+                                               [pasta_snapshot] * n_processos, [perfis] * n_processos,
+                                               [motor] * n_processos))
+            tempos = [tempo for tempo, _, _ in resultados]
+            iguais = all(previsoes.equals(esperado) for _, previsoes, _ in resultados)
+            ok = ok and iguais
+            memoria = " | ".join(f"Rss {m['Rss']:.0f} MiB, Pss {m['Pss']:.0f} MiB"
+                                 for _, _, m in resultados if m)
+            print(f"Snapshot ({motor}): CSV + preparação {tempo_csv:.2f} s | carregamento em "
+                  f"{n_processos} processos {1000 * min(tempos):.0f}-{1000 * max(tempos):.0f} ms | "
+                  f"previsões iguais: {iguais}")
+            if memoria:
+                print(f"  {memoria}")
+    return ok
+
+
+def _rss_atual():
+    """
+    Memória residente do processo em MiB (VmRSS), ou None fora do Linux.
+    Antes da medida, a memória já liberada é devolvida ao sistema (malloc_trim da glibc),
+    para que sobras das etapas anteriores não entrem na conta
+    """
+    if not os.path.exists('/proc/self/status'):
+        return None
+    gc.collect()
+    try:
+        ctypes.CDLL('libc.so.6').malloc_trim(0)
+    except (OSError, AttributeError):
+        pass
+    with open('/proc/self/status') as f:
+        for linha in f:
+            if linha.startswith('VmRSS:'):
+                return int(linha.split()[1]) / 1024
+    return None
+
+
+def _memoria_em_processo(arquivo, k, motor):
+    """
+    Executado num processo novo: memória residente acrescida pela carga dos dados e pela
+    preparação do modelo, no caminho antigo (motor None: DataFrame completo, matriz
+    normalizada e um KNeighborsRegressor por coluna alvo) ou no preditor com o motor dado
+    """
+    inicial = _rss_atual()
+    predictor = EnemKNNPredictor(arquivo, motor=motor or 'indice', usar_cache=False)
+    if motor is None:
+        df = pd.read_csv(arquivo, sep=';', encoding='latin1')
+        for coluna in predictor.colunas_alvo:
+            df = df[~df[coluna].isna()]
+        for coluna in predictor.colunas_categoricas:
+            df[coluna] = LabelEncoder().fit_transform(df[coluna].astype(str))
+        X_scaled = StandardScaler().fit_transform(df[predictor.colunas_categoricas])
+        estado = (df, X_scaled, [KNeighborsRegressor(n_neighbors=k).fit(X_scaled, df[coluna])
+                                 for coluna in predictor.colunas_alvo])
+        componentes = None
+    else:
+        predictor.carregar_dados()
+        predictor.preparar_modelo(k=k)
+        estado = predictor
+        componentes = predictor.relatorio_memoria()
+    final = _rss_atual()
+    del estado
+    return final - inicial if inicial is not None else None, componentes
+
+
+def benchmark_memoria(n_linhas, k):
+    """
+    Memória residente retida após carregar_dados e preparar_modelo, contra o caminho antigo,
+    cada um num processo novo
+    """
+    contexto = multiprocessing.get_context('spawn')
+    with tempfile.TemporaryDirectory() as pasta:
+        arquivo = os.path.join(pasta, "enem_sintetico.csv")
+        gerar_csv_sintetico(arquivo, n_linhas)
+        resultados = {}
+        for motor in (None, 'indice', 'perfis'):
+            with ProcessPoolExecutor(1, mp_context=contexto) as executor:
+                resultados[motor] = executor.submit(_memoria_em_processo, arquivo, k, motor).result()
+
+    antigo, _ = resultados.pop(None)
+    for motor, (atual, componentes) in resultados.items():
+        print(f"Motor {motor}: " + " | ".join(f"{nome} {tamanho / 2 ** 20:.1f} MiB"
+                                              for nome, tamanho in componentes.items()))
+        if antigo is not None:
+            print(f"  Memória retida ({n_linhas} linhas): caminho antigo {antigo:.0f} MiB | "
+                  f"atual {atual:.0f} MiB | redução {antigo / max(atual, 1):.1f}x")
+
+
+def benchmark_cubo(n_linhas, n_repeticoes=20):
+    """
+    Tempo de construção do cubo de agregados e de consultas por uma, duas e nenhuma
+    dimensão, conferindo contagens, médias e desvios com um groupby do pandas
+    """
+    with tempfile.TemporaryDirectory() as pasta:
+        arquivo = os.path.join(pasta, "enem_sintetico.csv")
+        gerar_csv_sintetico(arquivo, n_linhas)
+        predictor = EnemKNNPredictor(arquivo, usar_cache=False)
+        predictor.carregar_dados()
+
+    construcao = predictor.metricas.instantaneo()['etapas']['construcao_cubo']['segundos']
+    df = pd.DataFrame(predictor.codigos, columns=predictor.colunas_categoricas)
+    for i, coluna in enumerate(predictor.colunas_alvo):
+        df[coluna] = predictor.notas[i].astype(np.float64)
+
+    ok = True
+    for dimensoes in (['SG_UF_ESC', 'TP_DEPENDENCIA_ADM_ESC'], ['TP_COR_RACA'], []):
+        inicio = time.perf_counter()
+        for _ in range(n_repeticoes):
+            resultado = predictor.cubo.agregar(dimensoes)
+        tempo = (time.perf_counter() - inicio) / n_repeticoes
+
+        grupos = df.groupby(dimensoes) if dimensoes else df.groupby(np.zeros(len(df)))
+        iguais = np.array_equal(resultado['CONTAGEM'].to_numpy(), grupos.size().to_numpy())
+        for coluna in predictor.colunas_alvo:
+            iguais &= np.allclose(resultado[f"{coluna}_MEDIA"], grupos[coluna].mean())
+            iguais &= np.allclose(resultado[f"{coluna}_DP"], grupos[coluna].std(ddof=0))
+        ok = ok and iguais
+        print(f"Cubo por {' x '.join(dimensoes) or 'total'}: {1000 * tempo:.1f} ms/consulta | "
+              f"iguais ao groupby: {iguais}")
+    print(f"Cubo: {len(predictor.cubo.celulas)} células, {predictor.cubo.bytes_ocupados() / 2 ** 20:.1f} MiB, "
+          f"construído em {construcao:.2f} s")
+    return ok
+
+
+def benchmark_sensibilidade(n_linhas, k, motor='indice', n_perfis=20):
+    """
+    Compara a análise de sensibilidade em uma única busca em lote com uma chamada de
+    prever_notas por variação (como ao trocar um combobox de cada vez na interface),
+    conferindo que as notas previstas são as mesmas
+    """
+    with tempfile.TemporaryDirectory() as pasta:
+        arquivo = os.path.join(pasta, "enem_sintetico.csv")
+        gerar_csv_sintetico(arquivo, n_linhas)
+        predictor = EnemKNNPredictor(arquivo, motor=motor, usar_cache=False)
+        predictor.carregar_dados()
+        predictor.preparar_modelo(k=k)
+
+    perfis = perfis_aleatorios(n_perfis)
+    tempo_sequencial = tempo_lote = 0.0
+    identicas = True
+    for perfil in perfis:
+        variacoes = [{**perfil, coluna: valor}
+                     for coluna in predictor.colunas_categoricas
+                     for valor in predictor.label_encoders[coluna].classes_]
+        predictor.cache_previsoes.limpar()
+        inicio = time.perf_counter()
+        sequencial = [predictor.prever_notas(variacao) for variacao in variacoes]
+        tempo_sequencial += time.perf_counter() - inicio
+
+        inicio = time.perf_counter()
+        resultado = predictor.sensibilidade(perfil)
+        tempo_lote += time.perf_counter() - inicio
+
+        for coluna in predictor.colunas_alvo:
+            identicas &= np.array_equal(resultado[coluna].to_numpy(), [p[coluna] for p in sequencial])
+
+    print(f"Sensibilidade (motor {motor}, {len(variacoes)} variações por perfil, K={k}): "
+          f"uma previsão por variação {1000 * tempo_sequencial / n_perfis:.1f} ms/perfil | "
+          f"busca em lote {1000 * tempo_lote / n_perfis:.1f} ms/perfil | "
+          f"ganho {tempo_sequencial / tempo_lote:.1f}x | previsões iguais: {identicas}")
+    return identicas
+
+
+# Dependências de terceiros do núcleo: o tempo de importação delas é a referência
+# descontada do tempo de cada módulo no modo importacao
+DEPENDENCIAS_NUCLEO = "numpy, pandas, joblib, sklearn, sklearn.preprocessing, sklearn.neighbors, sklearn.model_selection"
+
+
+def tempos_importacao(modulos):
+    """
+    Executa `python -X importtime -c "import modulos"` num processo novo e retorna o tempo
+    acumulado de cada módulo importado e a soma dos módulos de primeiro nível (inclusive os
+    da inicialização do interpretador), em milissegundos
+    """
+    processo = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {modulos}"],
+                              capture_output=True, text=True, check=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)))
+    tempos = {}
+    total = 0.0
+    for linha in processo.stderr.splitlines():
+        if not linha.startswith("import time:") or "cumulative" in linha:
+            continue
+        _, acumulado, nome = linha.split("|")
+        tempos[nome.strip()] = int(acumulado) / 1000
+        # Os módulos aninhados são indentados depois do espaço que segue a barra
+        if not nome[1:].startswith(" "):
+            total += int(acumulado) / 1000
+    return tempos, total
+
+
+def benchmark_importacao(orcamento_ms, n_repeticoes=7, modulos=("preditor", "servidor", "apv")):
+    """
+    Tempo de importação dos módulos usados sem interface gráfica e verificação de que nenhum
+    deles carrega o Tk ou o matplotlib. O orçamento vale para o custo próprio de cada módulo:
+    o tempo de importá-lo menos o de importar só DEPENDENCIAS_NUCLEO, medidos em processos
+    novos um logo após o outro (mediana de n_repeticoes pares), para que a carga da máquina
+    afete os dois igualmente.
+    Retorna 1 se algum módulo passar do orçamento em milissegundos ou carregar a parte gráfica
+    """
+    falhas = 0
+    for modulo in modulos:
+        execucoes = []
+        for _ in range(n_repeticoes):
+            _, referencia = tempos_importacao(DEPENDENCIAS_NUCLEO)
+            tempos, total = tempos_importacao(modulo)
+            execucoes.append((total - referencia, tempos))
+        execucoes.sort(key=lambda execucao: execucao[0])
+        # Detalhes da execução mediana
+        proprio, tempos = execucoes[len(execucoes) // 2]
+        graficos = sorted({nome for nome in tempos
+                           if nome.split(".")[0] in ("tkinter", "_tkinter", "matplotlib")})
+        maiores = sorted(((nome, tempo) for nome, tempo in tempos.items()
+                          if "." not in nome and nome != modulo), key=lambda item: -item[1])[:3]
+        ok = proprio <= orcamento_ms and not graficos
+        falhas += not ok
+        print(f"Importação de {modulo}: {tempos[modulo]:.0f} ms, {proprio:+.0f} ms além das dependências "
+              f"(orçamento {orcamento_ms:.0f} ms) | "
+              f"maiores: {', '.join(f'{nome} {tempo:.0f} ms' for nome, tempo in maiores)} | "
+              f"{'ok' if ok else 'FALHOU'}")
+        if graficos:
+            print(f"  Módulos gráficos importados: {', '.join(graficos[:5])}")
+    return 1 if falhas else 0
+
+
+def medir_escala(arquivo, valores_k, n_consultas, motor='indice', tamanho_lote=20_000):
+    """
+    Executado num subprocesso por tamanho de arquivo, para que o pico de RSS seja só dele:
+    tempo de carga do CSV, tempo de ajuste do índice e, para cada K, a latência de uma
+    consulta isolada (sem o cache de previsões) e a vazão da previsão em lote
+    """
+    predictor = EnemKNNPredictor(arquivo, motor=motor, usar_cache=False)
+    inicio = time.perf_counter()
+    predictor.carregar_dados()
+    carga = time.perf_counter() - inicio
+
+    perfis = perfis_aleatorios(n_consultas)
+    lote = pd.DataFrame(perfis_aleatorios(tamanho_lote, semente=2))
+    resultados = []
+    for k in valores_k:
+        inicio = time.perf_counter()
+        predictor.preparar_modelo(k=k)
+        ajuste = time.perf_counter() - inicio
+
+        latencias = []
+        for perfil in perfis:
+            predictor.cache_previsoes.limpar()
+            inicio = time.perf_counter()
+            predictor.prever_notas(perfil)
+            latencias.append(time.perf_counter() - inicio)
+
+        inicio = time.perf_counter()
+        predictor.prever_lote(lote)
+        vazao = tamanho_lote / (time.perf_counter() - inicio)
+
+        resultados.append({
+            'registros': predictor.n_registros, 'k': k, 'motor': motor,
+            'carga_s': carga, 'ajuste_s': ajuste,
+            'consulta_p50_ms': 1000 * float(np.percentile(latencias, 50)),
+            'consulta_p99_ms': 1000 * float(np.percentile(latencias, 99)),
+            'lote_perfis_s': vazao,
+        })
+    predictor.invalidar_modelos()
+
+    # ru_maxrss é em KiB no Linux
+    pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    for resultado in resultados:
+        resultado['rss_pico_mib'] = pico
+    return resultados
+
+
+def comparar_com_referencia(resultados, referencia, tolerancia):
+    """
+    Lista as métricas que pioraram mais que a tolerância em relação a uma execução anterior
+    """
+    # Métricas em que um valor maior é pior; para a vazão, menor é pior
+    maior_pior = ['carga_s', 'ajuste_s', 'consulta_p50_ms', 'consulta_p99_ms', 'rss_pico_mib']
+    anteriores = {(r['linhas'], r['k'], r['motor']): r for r in referencia}
+    regressoes = []
+    for r in resultados:
+        anterior = anteriores.get((r['linhas'], r['k'], r['motor']))
+        if anterior is None:
+            continue
+        for metrica in maior_pior + ['lote_perfis_s']:
+            razao = r[metrica] / anterior[metrica] if anterior[metrica] else 1.0
+            if metrica == 'lote_perfis_s':
+                razao = 1 / razao if razao else float('inf')
+            if razao > 1 + tolerancia:
+                regressoes.append(f"{r['linhas']} linhas, K={r['k']}: {metrica} "
+                                  f"{anterior[metrica]:.3g} -> {r[metrica]:.3g}")
+    return regressoes
+
+
+def benchmark_escala(tamanhos, valores_k, n_consultas, motor='indice', pasta_dados=None,
+                     arquivo_json=None, referencia=None, tolerancia=0.2):
+    """
+    Carga, ajuste, latência, vazão em lote e pico de RSS para cada tamanho de arquivo e K.
+    Os CSVs sintéticos ficam em pasta_dados e são reaproveitados entre execuções.
+    Com uma referência (JSON de uma execução anterior), retorna 1 se alguma métrica piorou
+    mais que a tolerância
+    """
+    pasta_temporaria = None
+    if pasta_dados is None:
+        pasta_temporaria = tempfile.TemporaryDirectory()
+        pasta_dados = pasta_temporaria.name
+    os.makedirs(pasta_dados, exist_ok=True)
+
+    resultados = []
+    print(f"{'linhas':>10} {'K':>4} {'carga s':>8} {'ajuste s':>9} {'p50 ms':>8} {'p99 ms':>8} "
+          f"{'lote perfis/s':>14} {'RSS pico MiB':>13}")
+    try:
+        for n_linhas in tamanhos:
+            arquivo = os.path.join(pasta_dados, f"enem_sintetico_{n_linhas}.csv")
+            if not os.path.exists(arquivo):
+                gerar_csv_sintetico(arquivo, n_linhas)
+
+            comando = [sys.executable, os.path.abspath(__file__), "--medir", arquivo, "--motor", motor,
+                       "--valores-k", *map(str, valores_k), "--consultas", str(n_consultas)]
+            saida = subprocess.run(comando, capture_output=True, text=True, check=True).stdout
+            for r in json.loads(saida.strip().splitlines()[-1]):
+                r['linhas'] = n_linhas
+                resultados.append(r)
+                print(f"{n_linhas:>10} {r['k']:>4} {r['carga_s']:>8.2f} {r['ajuste_s']:>9.2f} "
+                      f"{r['consulta_p50_ms']:>8.3f} {r['consulta_p99_ms']:>8.3f} "
+                      f"{r['lote_perfis_s']:>14.0f} {r['rss_pico_mib']:>13.0f}")
+    finally:
+        if pasta_temporaria is not None:
+            pasta_temporaria.cleanup()
+
+    if arquivo_json:
+        with open(arquivo_json, 'w', encoding='utf-8') as f:
+            json.dump(resultados, f, indent=1)
+
+    if referencia:
+        with open(referencia, encoding='utf-8') as f:
+            regressoes = comparar_com_referencia(resultados, json.load(f), tolerancia)
+        for regressao in regressoes:
+            print(f"Regressão: {regressao}")
+        if regressoes:
+            return 1
+        print(f"Nenhuma métrica piorou mais que {tolerancia:.0%} em relação a {referencia}.")
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks do preditor de notas do ENEM")
+    parser.add_argument("--linhas", type=int, default=200_000)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--consultas", type=int, default=200)
+    parser.add_argument("--modo", choices=["busca", "paridade", "fragmentado", "servidor", "snapshot", "memoria",
+                                           "cubo", "sensibilidade", "importacao", "escala"],
+                        nargs="+", default=["busca", "paridade", "fragmentado", "servidor", "snapshot", "memoria",
+                                            "cubo", "sensibilidade", "importacao"])
+    parser.add_argument("--motor", choices=EnemKNNPredictor.MOTORES, default='indice',
+                        help="motor de busca de vizinhos dos modos sensibilidade e escala")
+    parser.add_argument("--tamanhos", type=int, nargs="+", default=[10_000, 100_000, 1_000_000],
+                        help="linhas dos CSVs sintéticos do modo escala")
+    parser.add_argument("--valores-k", type=int, nargs="+", default=[1, 5, 50],
+                        help="valores de K do modo escala")
+    parser.add_argument("--pasta-dados", help="pasta onde os CSVs sintéticos são gerados e reaproveitados")
+    parser.add_argument("--json", help="grava os resultados do modo escala neste arquivo")
+    parser.add_argument("--referencia", help="JSON de uma execução anterior do modo escala para comparação")
+    parser.add_argument("--tolerancia", type=float, default=0.2,
+                        help="piora relativa aceita em relação à referência")
+    # Os módulos sem interface gráfica importam em 1,6-1,9 s, quase tudo pandas e scikit-learn;
+    # descontadas essas dependências, a mediana fica dentro de ±200 ms de zero nesta máquina.
+    # Um módulo 30% mais lento (~550 ms) ou o Tk com o matplotlib (~700 ms) passam do orçamento
+    parser.add_argument("--orcamento-importacao", type=float, default=300,
+                        help="tempo máximo de importação, em ms, de cada módulo sem interface gráfica "
+                             "além das suas dependências (pandas, scikit-learn, numpy, joblib)")
+    # Uso interno do modo escala: mede um único arquivo e imprime o resultado em JSON
+    parser.add_argument("--medir", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.medir:
+        resultados = medir_escala(args.medir, args.valores_k, args.consultas, args.motor)
+        print(json.dumps(resultados))
+        return 0
+
+    # Qualquer verificação que falhe (resultados diferentes, orçamento de importação
+    # estourado ou regressão no modo escala) faz o benchmark terminar com erro
+    ok = True
+    if "busca" in args.modo:
+        ok = benchmark_busca_compartilhada(args.linhas, args.k, args.consultas) and ok
+    if "paridade" in args.modo:
+        ok = verificar_paridade(args.linhas, sorted({1, args.k, 50}), args.consultas) and ok
+    if "fragmentado" in args.modo:
+        processos = [0] + [2 ** i for i in range(int(np.log2(os.cpu_count() or 1)) + 1)]
+        benchmark_fragmentado(args.linhas, args.k, 20 * args.consultas, processos)
+    if "servidor" in args.modo:
+        benchmark_servidor(args.linhas, args.k, 50 * args.consultas)
+    if "snapshot" in args.modo:
+        ok = benchmark_snapshot(args.linhas, args.k, args.consultas) and ok
+    if "memoria" in args.modo:
+        benchmark_memoria(args.linhas, args.k)
+    if "cubo" in args.modo:
+        ok = benchmark_cubo(args.linhas) and ok
+    if "sensibilidade" in args.modo:
+        ok = benchmark_sensibilidade(args.linhas, args.k, args.motor) and ok
+    if "importacao" in args.modo:
+        ok = benchmark_importacao(args.orcamento_importacao) == 0 and ok
+    if "escala" in args.modo:
+        ok = benchmark_escala(args.tamanhos, args.valores_k, args.consultas, args.motor, args.pasta_dados,
+                              args.json, args.referencia, args.tolerancia) == 0 and ok
+    if not ok:
+        print("Alguma verificação falhou.")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,738 @@
+import numpy as np
+import tkinter as tk
+from tkinter import ttk, messagebox
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+import time
+import threading
+import queue
+from concurrent.futures import ThreadPoolExecutor
+
+
+class EnemKNNApp:
+    # Etapas do pipeline de previsão e o texto exibido enquanto cada uma executa
+    ETAPAS = {
+        'modelo': "Preparando modelo K-NN...",
+        'previsao': "Calculando previsões...",
+        'resultados': "Gerando resultados...",
+    }
+    INTERVALO_EVENTOS_MS = 20
+
+    # Nomes amigáveis para as disciplinas
+    nomes_disciplinas = {
+        'NU_NOTA_CN': 'Ciências da Natureza',
+        'NU_NOTA_CH': 'Ciências Humanas',
+        'NU_NOTA_LC': 'Linguagens e Códigos',
+        'NU_NOTA_MT': 'Matemática',
+        'NU_NOTA_REDACAO': 'Redação'
+    }
+
+    # Dimensões e estatísticas da aba de análise exploratória
+    nomes_dimensoes = {
+        'TP_COR_RACA': 'Raça/Cor',
+        'TP_ESCOLA': 'Tipo de Escola',
+        'TP_ENSINO': 'Tipo de Ensino',
+        'SG_UF_ESC': 'UF da Escola',
+        'TP_DEPENDENCIA_ADM_ESC': 'Dependência Adm',
+        'TP_LOCALIZACAO_ESC': 'Localização',
+        'NU_ANO': 'Edição do ENEM'
+    }
+    estatisticas_analise = {
+        'Média': 'MEDIA',
+        'Mediana': 'Q50',
+        'Desvio Padrão': 'DP',
+        'Contagem': None
+    }
+    SEM_COLUNAS = "(nenhuma)"
+
+    def __init__(self, root, predictor):
+        self.root = root
+        self.predictor = predictor
+
+        # Pipeline de previsão: uma thread de trabalho publica eventos numa fila
+        # consumida pela thread da interface
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        self.eventos = queue.Queue()
+        self.id_previsao = 0
+        self.cancelamento = None
+        self.inicio_previsao = 0.0
+        self.duracoes_atuais = {}
+        self.duracoes_etapas = {nome: 1.0 for nome in self.ETAPAS}
+        # Perfil e K da última previsão concluída; a sensibilidade é calculada sob demanda,
+        # quando a aba é aberta, e uma única vez por previsão
+        self.perfil_sensibilidade = None
+        self.sensibilidade_solicitada = False
+        self.root.title("Sistema de Previsão de Notas do ENEM usando K-NN")
+        self.root.geometry("1200x800")
+
+        # Criar frames principais
+        self.frame_entrada = ttk.LabelFrame(root, text="Dados do Aluno")
+        self.frame_entrada.pack(fill="both", expand="yes", padx=10, pady=10)
+
+        self.frame_resultados = ttk.LabelFrame(root, text="Resultados da Previsão")
+        self.frame_resultados.pack(fill="both", expand="yes", padx=10, pady=10)
+
+        self.progress_frame = ttk.Frame(root)
+        self.progress_frame.pack(fill="x", padx=10, pady=10)
+
+        self.progress = ttk.Progressbar(self.progress_frame, orient="horizontal", length=300, mode="determinate")
+        self.progress.pack(side="left", padx=10, pady=10)
+
+        self.status_label = ttk.Label(self.progress_frame, text="Status: Aguardando dados...")
+        self.status_label.pack(side="left", padx=10, pady=10)
+
+        # Criar widgets de entrada
+        self.criar_campos_entrada()
+
+        # Criar área para resultados
+        self.criar_area_resultados()
+
+        # Alterar o formulário cancela a previsão em andamento
+        for combo in (self.cor_raca_combo, self.tipo_escola_combo, self.tipo_ensino_combo,
+                      self.uf_combo, self.dependencia_combo, self.localizacao_combo):
+            combo.bind("<<ComboboxSelected>>", self.cancelar_previsao)
+        self.k_var.trace_add("write", self.cancelar_previsao)
+
+        self.root.after(self.INTERVALO_EVENTOS_MS, self.processar_eventos)
+
+    def criar_campos_entrada(self):
+        # Dicionário para mapear valores numéricos para textos
+        self.opcoes_cor_raca = {
+            "0": "Não declarado",
+            "1": "Branca",
+            "2": "Preta",
+            "3": "Parda",
+            "4": "Amarela",
+            "5": "Indígena",
+            "6": "Não dispõe da informação"
+        }
+
+        self.opcoes_tipo_escola = {
+            "1": "Não respondeu",
+            "2": "Pública",
+            "3": "Privada",
+            "4": "Exterior"
+        }
+
+        self.opcoes_ensino = {
+            "1": "Ensino Regular",
+            "2": "Educação Especial",
+            "3": "EJA"
+        }
+
+        self.opcoes_dependencia = {
+            "1": "Federal",
+            "2": "Estadual",
+            "3": "Municipal",
+            "4": "Privada"
+        }
+
+        self.opcoes_localizacao = {
+            "1": "Urbana",
+            "2": "Rural"
+        }
+
+        # Lista de UFs brasileiras
+        self.opcoes_uf = {
+            "AC": "Acre", "AL": "Alagoas", "AP": "Amapá", "AM": "Amazonas",
+            "BA": "Bahia", "CE": "Ceará", "DF": "Distrito Federal", "ES": "Espírito Santo",
+            "GO": "Goiás", "MA": "Maranhão", "MT": "Mato Grosso", "MS": "Mato Grosso do Sul",
+            "MG": "Minas Gerais", "PA": "Pará", "PB": "Paraíba", "PR": "Paraná",
+            "PE": "Pernambuco", "PI": "Piauí", "RJ": "Rio de Janeiro", "RN": "Rio Grande do Norte",
+            "RS": "Rio Grande do Sul", "RO": "Rondônia", "RR": "Roraima", "SC": "Santa Catarina",
+            "SP": "São Paulo", "SE": "Sergipe", "TO": "Tocantins"
+        }
+
+        # Frame para organizar os widgets em grid
+        frame_grid = ttk.Frame(self.frame_entrada)
+        frame_grid.pack(fill="both", padx=10, pady=10)
+
+        # Linha 0
+        ttk.Label(frame_grid, text="Raça/Cor:").grid(row=0, column=0, padx=5, pady=5, sticky="w")
+        self.cor_raca_var = tk.StringVar()
+        self.cor_raca_combo = ttk.Combobox(frame_grid, textvariable=self.cor_raca_var)
+        self.cor_raca_combo['values'] = list(self.opcoes_cor_raca.values())
+        self.cor_raca_combo.grid(row=0, column=1, padx=5, pady=5, sticky="w")
+        self.cor_raca_combo.current(0)
+
+        ttk.Label(frame_grid, text="Tipo de Escola:").grid(row=0, column=2, padx=5, pady=5, sticky="w")
+        self.tipo_escola_var = tk.StringVar()
+        self.tipo_escola_combo = ttk.Combobox(frame_grid, textvariable=self.tipo_escola_var)
+        self.tipo_escola_combo['values'] = list(self.opcoes_tipo_escola.values())
+        self.tipo_escola_combo.grid(row=0, column=3, padx=5, pady=5, sticky="w")
+        self.tipo_escola_combo.current(0)
+
+        # Linha 1
+        ttk.Label(frame_grid, text="Tipo de Ensino:").grid(row=1, column=0, padx=5, pady=5, sticky="w")
+        self.tipo_ensino_var = tk.StringVar()
+        self.tipo_ensino_combo = ttk.Combobox(frame_grid, textvariable=self.tipo_ensino_var)
+        self.tipo_ensino_combo['values'] = list(self.opcoes_ensino.values())
+        self.tipo_ensino_combo.grid(row=1, column=1, padx=5, pady=5, sticky="w")
+        self.tipo_ensino_combo.current(0)
+
+        ttk.Label(frame_grid, text="UF da Escola:").grid(row=1, column=2, padx=5, pady=5, sticky="w")
+        self.uf_var = tk.StringVar()
+        self.uf_combo = ttk.Combobox(frame_grid, textvariable=self.uf_var)
+        self.uf_combo['values'] = list(self.opcoes_uf.keys())
+        self.uf_combo.grid(row=1, column=3, padx=5, pady=5, sticky="w")
+        self.uf_combo.current(0)
+
+        # Linha 2
+        ttk.Label(frame_grid, text="Dependência Adm:").grid(row=2, column=0, padx=5, pady=5, sticky="w")
+        self.dependencia_var = tk.StringVar()
+        self.dependencia_combo = ttk.Combobox(frame_grid, textvariable=self.dependencia_var)
+        self.dependencia_combo['values'] = list(self.opcoes_dependencia.values())
+        self.dependencia_combo.grid(row=2, column=1, padx=5, pady=5, sticky="w")
+        self.dependencia_combo.current(0)
+
+        ttk.Label(frame_grid, text="Localização:").grid(row=2, column=2, padx=5, pady=5, sticky="w")
+        self.localizacao_var = tk.StringVar()
+        self.localizacao_combo = ttk.Combobox(frame_grid, textvariable=self.localizacao_var)
+        self.localizacao_combo['values'] = list(self.opcoes_localizacao.values())
+        self.localizacao_combo.grid(row=2, column=3, padx=5, pady=5, sticky="w")
+        self.localizacao_combo.current(0)
+
+        # Linha 3 - Parâmetro K
+        ttk.Label(frame_grid, text="Número de Vizinhos (K):").grid(row=3, column=0, padx=5, pady=5, sticky="w")
+        self.k_var = tk.StringVar(value="5")
+        self.k_entry = ttk.Entry(frame_grid, textvariable=self.k_var, width=5)
+        self.k_entry.grid(row=3, column=1, padx=5, pady=5, sticky="w")
+
+        # Botão para fazer a previsão
+        self.botao_prever = ttk.Button(frame_grid, text="Prever Notas", command=self.iniciar_previsao)
+        self.botao_prever.grid(row=4, column=0, columnspan=4, padx=5, pady=20)
+
+    def criar_area_resultados(self):
+        # Frame para os resultados
+        self.notebook = ttk.Notebook(self.frame_resultados)
+        self.notebook.pack(fill="both", expand="yes", padx=10, pady=10)
+
+        # Tab para resultados textuais
+        self.tab_resultados = ttk.Frame(self.notebook)
+        self.notebook.add(self.tab_resultados, text="Resultados")
+
+        # Tab para gráficos
+        self.tab_graficos = ttk.Frame(self.notebook)
+        self.notebook.add(self.tab_graficos, text="Gráficos")
+
+        # Tab para comparação
+        self.tab_comparacao = ttk.Frame(self.notebook)
+        self.notebook.add(self.tab_comparacao, text="Comparação com Vizinhos")
+
+        # Tab para a variação das notas ao trocar uma característica do perfil
+        self.tab_sensibilidade = ttk.Frame(self.notebook)
+        self.notebook.add(self.tab_sensibilidade, text="Sensibilidade")
+
+        # Tab para análise exploratória dos dados de treino
+        self.tab_analise = ttk.Frame(self.notebook)
+        self.notebook.add(self.tab_analise, text="Análise Exploratória")
+
+        # Área de texto para resultados
+        self.text_resultados = tk.Text(self.tab_resultados, height=15, width=80)
+        self.text_resultados.pack(fill="both", expand="yes", padx=10, pady=10)
+
+        # Gráficos criados uma única vez e atualizados a cada previsão
+        self.criar_graficos()
+        self.criar_grafico_comparacao()
+        self.criar_aba_sensibilidade()
+        self.criar_aba_analise()
+
+        self.notebook.bind("<<NotebookTabChanged>>", self.solicitar_sensibilidade)
+
+    def obter_dados_entrada(self):
+        """
+        Lê os valores escolhidos no formulário (apenas na thread da interface)
+        """
+        def codigo(opcoes, texto):
+            return str(list(opcoes.keys())[list(opcoes.values()).index(texto)])
+
+        return {
+            'TP_COR_RACA': codigo(self.opcoes_cor_raca, self.cor_raca_var.get()),
+            'TP_ESCOLA': codigo(self.opcoes_tipo_escola, self.tipo_escola_var.get()),
+            'TP_ENSINO': codigo(self.opcoes_ensino, self.tipo_ensino_var.get()),
+            'SG_UF_ESC': self.uf_var.get(),
+            'TP_DEPENDENCIA_ADM_ESC': codigo(self.opcoes_dependencia, self.dependencia_var.get()),
+            'TP_LOCALIZACAO_ESC': codigo(self.opcoes_localizacao, self.localizacao_var.get())
+        }
+
+    def iniciar_previsao(self):
+        """
+        Lê o formulário e envia a previsão para a thread de trabalho.
+        Uma previsão ainda em andamento é cancelada
+        """
+        # Valor de K
+        try:
+            k = int(self.k_var.get())
+            if k <= 0 or k > self.predictor.k_max:
+                raise ValueError(f"K deve estar entre 1 e {self.predictor.k_max}")
+        except ValueError:
+            messagebox.showerror("Erro", f"Valor inválido para K (máximo {self.predictor.k_max}). Usando K=5.")
+            k = 5
+            self.k_var.set("5")
+
+        try:
+            dados_entrada = self.obter_dados_entrada()
+        except ValueError:
+            messagebox.showerror("Erro", "Selecione valores válidos para todos os campos.")
+            return
+
+        self.cancelar_previsao()
+        self.id_previsao += 1
+        self.cancelamento = threading.Event()
+        self.inicio_previsao = time.perf_counter()
+        self.duracoes_atuais = {}
+
+        self.botao_prever.config(state="disabled")
+        self.definir_progresso(0, "Iniciando previsão...")
+
+        self.executor.submit(self.executar_pipeline, self.id_previsao, dados_entrada, k, self.cancelamento)
+
+    def solicitar_sensibilidade(self, *args):
+        """
+        Envia o cálculo da sensibilidade da última previsão para a thread de trabalho, se a aba
+        de sensibilidade estiver aberta e o cálculo ainda não tiver sido pedido
+        """
+        if (self.perfil_sensibilidade is None or self.sensibilidade_solicitada
+                or self.notebook.select() != str(self.tab_sensibilidade)):
+            return
+        self.sensibilidade_solicitada = True
+        dados_entrada, k = self.perfil_sensibilidade
+        self.definir_texto_sensibilidade("Calculando a sensibilidade do perfil...")
+        self.executor.submit(self.calcular_sensibilidade, self.id_previsao, dados_entrada, k)
+
+    def calcular_sensibilidade(self, id_previsao, dados_entrada, k):
+        """
+        Calcula a sensibilidade na thread de trabalho e publica o resultado na fila de eventos
+        """
+        try:
+            sensibilidade = self.predictor.sensibilidade(dados_entrada, k=k)
+        except Exception as e:
+            sensibilidade = None
+            print(f"Erro ao calcular a sensibilidade: {e}")
+        self.eventos.put(('sensibilidade', id_previsao, sensibilidade))
+
+    def cancelar_previsao(self, *args):
+        """
+        Cancela a previsão em andamento (por exemplo, quando o formulário muda).
+        O cancelamento vale a partir da próxima etapa do pipeline
+        """
+        if self.cancelamento is not None and not self.cancelamento.is_set():
+            self.cancelamento.set()
+            self.definir_progresso(0, "Previsão cancelada: dados alterados.")
+            self.botao_prever.config(state="normal")
+
+    def executar_pipeline(self, id_previsao, dados_entrada, k, cancelamento):
+        """
+        Executa as etapas de cálculo na thread de trabalho, publicando um evento
+        na fila ao fim de cada etapa. Não acessa nenhum widget
+        """
+        etapas = [
+            ('modelo', lambda: self.predictor.preparar_modelo(k=k)),
+            ('previsao', lambda: self.predictor.prever_notas(dados_entrada)),
+        ]
+        try:
+            resultados = {}
+            for nome, etapa in etapas:
+                if cancelamento.is_set():
+                    return
+                inicio = time.perf_counter()
+                resultado = etapa()
+                self.eventos.put(('etapa', id_previsao, nome, time.perf_counter() - inicio))
+                if resultado is None or resultado is False:
+                    self.eventos.put(('erro', id_previsao, "Não foi possível fazer a previsão. Verifique os dados."))
+                    return
+                resultados[nome] = resultado
+            if not cancelamento.is_set():
+                self.eventos.put(('concluido', id_previsao, (dados_entrada, k, resultados['previsao'])))
+        except Exception as e:
+            self.eventos.put(('erro', id_previsao, f"Ocorreu um erro: {str(e)}"))
+
+    def processar_eventos(self):
+        """
+        Consome, na thread da interface, os eventos publicados pela thread de trabalho
+        """
+        try:
+            while True:
+                tipo, id_previsao, *dados = self.eventos.get_nowait()
+                # A sensibilidade chega depois da previsão concluída; só vale a da última previsão
+                if tipo == 'sensibilidade':
+                    if id_previsao == self.id_previsao:
+                        self.atualizar_sensibilidade(dados[0])
+                    continue
+                if id_previsao != self.id_previsao or self.cancelamento is None or self.cancelamento.is_set():
+                    continue
+
+                if tipo == 'etapa':
+                    nome, duracao = dados
+                    self.duracoes_atuais[nome] = duracao
+                    etapas = list(self.ETAPAS)
+                    proxima = etapas[etapas.index(nome) + 1]
+                    self.definir_progresso(self.fracao_concluida(), self.ETAPAS[proxima])
+                elif tipo == 'concluido':
+                    dados_entrada, k, previsoes = dados[0]
+                    inicio = time.perf_counter()
+                    self.exibir_resultados(dados_entrada, previsoes)
+                    self.perfil_sensibilidade = (dados_entrada, k)
+                    self.sensibilidade_solicitada = False
+                    self.definir_texto_sensibilidade("Abra esta aba para calcular a sensibilidade do perfil.")
+                    self.duracoes_atuais['resultados'] = time.perf_counter() - inicio
+                    self.registrar_duracoes()
+                    total = time.perf_counter() - self.inicio_previsao
+                    self.definir_progresso(100, f"Previsão concluída com sucesso! ({1000 * total:.0f} ms)")
+                    self.cancelamento.set()
+                    self.botao_prever.config(state="normal")
+                    self.solicitar_sensibilidade()
+                elif tipo == 'erro':
+                    messagebox.showerror("Erro", dados[0])
+                    self.definir_progresso(0, "Erro na previsão.")
+                    self.cancelamento.set()
+                    self.botao_prever.config(state="normal")
+        except queue.Empty:
+            pass
+        self.root.after(self.INTERVALO_EVENTOS_MS, self.processar_eventos)
+
+    def fracao_concluida(self):
+        """
+        Progresso (0-100) ponderado pela duração de cada etapa nas previsões anteriores
+        """
+        total = sum(self.duracoes_etapas.values())
+        concluido = sum(self.duracoes_etapas[nome] for nome in self.duracoes_atuais)
+        return 100 * concluido / total if total > 0 else 0
+
+    def registrar_duracoes(self):
+        """
+        Atualiza a estimativa de duração de cada etapa (média móvel exponencial)
+        """
+        for nome, duracao in self.duracoes_atuais.items():
+            self.duracoes_etapas[nome] = 0.5 * self.duracoes_etapas[nome] + 0.5 * duracao
+
+    def definir_progresso(self, valor, texto):
+        """
+        Atualiza a barra de progresso e o texto de status
+        """
+        self.progress.config(value=valor)
+        self.status_label.config(text=f"Status: {texto}")
+
+    def exibir_resultados(self, dados_entrada, previsoes):
+        """
+        Mostra as notas previstas e os gráficos
+        """
+        # Limpar resultados anteriores
+        self.text_resultados.delete(1.0, tk.END)
+
+        # Mostrar resultados no widget Text
+        self.text_resultados.insert(tk.END, "=== PREVISÃO DE NOTAS DO ENEM ===\n\n")
+        self.text_resultados.insert(tk.END, f"Dados do aluno:\n")
+        self.text_resultados.insert(tk.END, f"- Raça/Cor: {self.opcoes_cor_raca[dados_entrada['TP_COR_RACA']]}\n")
+        self.text_resultados.insert(tk.END, f"- Tipo de Escola: {self.opcoes_tipo_escola[dados_entrada['TP_ESCOLA']]}\n")
+        self.text_resultados.insert(tk.END, f"- Tipo de Ensino: {self.opcoes_ensino[dados_entrada['TP_ENSINO']]}\n")
+        self.text_resultados.insert(tk.END, f"- UF da Escola: {dados_entrada['SG_UF_ESC']}\n")
+        self.text_resultados.insert(tk.END, f"- Dependência Administrativa: "
+                                            f"{self.opcoes_dependencia[dados_entrada['TP_DEPENDENCIA_ADM_ESC']]}\n")
+        self.text_resultados.insert(tk.END, f"- Localização: "
+                                            f"{self.opcoes_localizacao[dados_entrada['TP_LOCALIZACAO_ESC']]}\n\n")
+
+        self.text_resultados.insert(tk.END, "Notas previstas:\n")
+
+        # Exibir as notas previstas
+        for coluna_alvo in self.predictor.colunas_alvo:
+            nota_prevista = previsoes[coluna_alvo]
+            notas_vizinhos = previsoes[f"{coluna_alvo}_vizinhos"]
+            media_vizinhos = np.mean(notas_vizinhos)
+
+            # Determinar se a nota é maior ou menor que a média dos vizinhos
+            comparacao = "IGUAL À" if abs(
+                nota_prevista - media_vizinhos) < 0.01 else "MAIOR QUE" if nota_prevista > media_vizinhos else "MENOR QUE"
+
+            self.text_resultados.insert(tk.END,
+                                        f"- {self.nomes_disciplinas[coluna_alvo]}: {nota_prevista:.1f} ({comparacao} a média dos vizinhos: {media_vizinhos:.1f})\n")
+
+        # Calcular média geral
+        notas_gerais = [previsoes[coluna] for coluna in self.predictor.colunas_alvo]
+        media_geral = np.mean(notas_gerais)
+        self.text_resultados.insert(tk.END, f"\nMédia Geral Prevista: {media_geral:.1f}\n")
+
+        # Atualizar gráficos
+        self.atualizar_graficos(previsoes)
+        self.atualizar_grafico_comparacao(previsoes)
+
+    def criar_graficos(self):
+        """
+        Cria, uma única vez, o gráfico de notas previstas por disciplina.
+        As previsões seguintes apenas atualizam as barras (atualizar_graficos)
+        """
+        # Figure independente do pyplot: não fica registrada no gerenciador global de figuras
+        fig = Figure(figsize=(10, 6))
+        ax = fig.add_subplot()
+
+        disciplinas = [self.nomes_disciplinas[coluna] for coluna in self.predictor.colunas_alvo]
+
+        # Criar gráfico de barras
+        self.barras_previsao = ax.bar(disciplinas, np.zeros(len(disciplinas)), color='skyblue')
+
+        # Rótulos com os valores das barras, preenchidos a cada previsão
+        self.rotulos_previsao = [
+            ax.text(bar.get_x() + bar.get_width() / 2., 0, '', ha='center', va='bottom')
+            for bar in self.barras_previsao
+        ]
+
+        ax.set_ylim(0, 1000)  # Limite para notas do ENEM
+        ax.set_ylabel('Nota Prevista')
+        ax.set_title('Previsão de Notas por Disciplina')
+
+        # Adicionar o gráfico à interface
+        self.canvas_graficos = FigureCanvasTkAgg(fig, master=self.tab_graficos)
+        self.canvas_graficos.get_tk_widget().pack(fill="both", expand=True)
+        self.canvas_graficos.draw_idle()
+
+    def atualizar_graficos(self, previsoes):
+        """
+        Atualiza as alturas e os rótulos do gráfico de notas previstas
+        """
+        notas = [previsoes[coluna] for coluna in self.predictor.colunas_alvo]
+        self.atualizar_barras(self.barras_previsao, self.rotulos_previsao, notas)
+        self.canvas_graficos.draw_idle()
+
+    def criar_grafico_comparacao(self):
+        """
+        Cria, uma única vez, o gráfico de comparação com os vizinhos
+        """
+        fig = Figure(figsize=(10, 6))
+        ax = fig.add_subplot()
+
+        disciplinas = [self.nomes_disciplinas[coluna] for coluna in self.predictor.colunas_alvo]
+
+        width = 0.35  # largura das barras
+
+        # Posições das barras
+        x = np.arange(len(disciplinas))
+
+        # Criar barras
+        zeros = np.zeros(len(disciplinas))
+        self.barras_comparacao = [
+            ax.bar(x - width / 2, zeros, width, label='Nota Prevista', color='skyblue'),
+            ax.bar(x + width / 2, zeros, width, label='Média dos Vizinhos', color='lightcoral'),
+        ]
+        self.rotulos_comparacao = [
+            [ax.text(bar.get_x() + bar.get_width() / 2., 0, '', ha='center', va='bottom', fontsize=8)
+             for bar in bars]
+            for bars in self.barras_comparacao
+        ]
+
+        # Configurar eixos
+        ax.set_ylabel('Nota')
+        ax.set_title('Comparação: Nota Prevista vs. Média dos Vizinhos')
+        ax.set_xticks(x)
+        ax.set_xticklabels(disciplinas)
+        ax.legend()
+        ax.set_ylim(0, 1000)  # Limite para notas do ENEM
+
+        # Adicionar o gráfico à interface
+        self.canvas_comparacao = FigureCanvasTkAgg(fig, master=self.tab_comparacao)
+        self.canvas_comparacao.get_tk_widget().pack(fill="both", expand=True)
+        self.canvas_comparacao.draw_idle()
+
+    def atualizar_grafico_comparacao(self, previsoes):
+        """
+        Atualiza as barras de nota prevista e de média dos vizinhos
+        """
+        nota_prevista = [previsoes[coluna] for coluna in self.predictor.colunas_alvo]
+        media_vizinhos = [np.mean(previsoes[f"{coluna}_vizinhos"]) for coluna in self.predictor.colunas_alvo]
+        for bars, rotulos, valores in zip(self.barras_comparacao, self.rotulos_comparacao,
+                                          [nota_prevista, media_vizinhos]):
+            self.atualizar_barras(bars, rotulos, valores)
+        self.canvas_comparacao.draw_idle()
+
+    def criar_aba_sensibilidade(self):
+        """
+        Cria a aba de sensibilidade, preenchida sob demanda com o mapa de calor da
+        variação das notas quando uma única característica do perfil muda.
+        A imagem e a barra de cores são criadas na primeira análise e depois só atualizadas
+        """
+        self.figura_sensibilidade = Figure(figsize=(10, 6))
+        self.canvas_sensibilidade = FigureCanvasTkAgg(self.figura_sensibilidade, master=self.tab_sensibilidade)
+        self.canvas_sensibilidade.get_tk_widget().pack(fill="both", expand=True)
+        self.texto_sensibilidade = self.figura_sensibilidade.text(0.5, 0.5, '', ha='center', va='center')
+        self.eixo_sensibilidade = None
+        self.imagem_sensibilidade = None
+        self.indice_sensibilidade = None
+        self.definir_texto_sensibilidade("Faça uma previsão para ver a sensibilidade do perfil.")
+
+    def definir_texto_sensibilidade(self, texto):
+        """
+        Esconde o mapa de calor da sensibilidade e mostra uma mensagem no lugar
+        """
+        self.texto_sensibilidade.set_text(texto)
+        self.texto_sensibilidade.set_visible(True)
+        for ax in self.figura_sensibilidade.axes:
+            ax.set_visible(False)
+        self.canvas_sensibilidade.draw_idle()
+
+    def criar_mapa_sensibilidade(self, sensibilidade, alvos, textos):
+        """
+        Cria o eixo, a imagem, a barra de cores e as linhas que separam as características
+        e ajusta o layout para os rótulos mais longos possíveis.
+        Só é chamado de novo se as linhas da análise mudarem (vocabulários de outros dados)
+        """
+        for ax in self.figura_sensibilidade.axes:
+            self.figura_sensibilidade.delaxes(ax)
+        ax = self.figura_sensibilidade.add_subplot()
+        self.imagem_sensibilidade = ax.imshow(np.zeros((len(sensibilidade), len(alvos))),
+                                              aspect='auto', cmap='RdBu', vmin=-1, vmax=1)
+        ax.set_xticks(np.arange(len(alvos)))
+        ax.set_xticklabels([self.nomes_disciplinas.get(alvo, 'Média Geral') for alvo in alvos],
+                           rotation=30, ha='right')
+        ax.set_yticks(np.arange(len(sensibilidade)))
+
+        # Linhas separando as características
+        features = sensibilidade.index.get_level_values('FEATURE')
+        for posicao in np.flatnonzero(features[1:] != features[:-1]):
+            ax.axhline(posicao + 0.5, color='white', linewidth=2)
+
+        self.figura_sensibilidade.colorbar(self.imagem_sensibilidade, ax=ax, label='Diferença para o perfil atual')
+        ax.set_title('Variação das notas previstas ao trocar uma característica')
+        ax.set_yticklabels([f"{texto} (atual)" for texto in textos], fontsize=7)
+        self.figura_sensibilidade.tight_layout()
+        self.eixo_sensibilidade = ax
+        self.indice_sensibilidade = sensibilidade.index
+
+    def atualizar_sensibilidade(self, sensibilidade):
+        """
+        Atualiza o mapa de calor da sensibilidade: uma linha por valor de cada característica,
+        uma coluna por disciplina, com a diferença para a nota prevista do perfil atual
+        """
+        if sensibilidade is None:
+            self.definir_texto_sensibilidade("Não foi possível calcular a sensibilidade do perfil.")
+            return
+        alvos = self.predictor.colunas_alvo + ['MEDIA_GERAL']
+        deltas = sensibilidade[[f"{alvo}_DELTA" for alvo in alvos]].to_numpy(dtype=np.float64)
+        textos = [f"{self.nomes_dimensoes[feature]}: {self.rotulo_valor(feature, valor)}"
+                  for feature, valor in sensibilidade.index]
+        rotulos = [texto + (" (atual)" if atual else "") for texto, atual in zip(textos, sensibilidade['ATUAL'])]
+        limite = max(np.abs(deltas).max(), 1.0)
+
+        if self.indice_sensibilidade is None or not self.indice_sensibilidade.equals(sensibilidade.index):
+            self.criar_mapa_sensibilidade(sensibilidade, alvos, textos)
+        self.imagem_sensibilidade.set_data(deltas)
+        self.imagem_sensibilidade.set_clim(-limite, limite)
+        self.eixo_sensibilidade.set_yticklabels(rotulos, fontsize=7)
+
+        self.texto_sensibilidade.set_visible(False)
+        for ax in self.figura_sensibilidade.axes:
+            ax.set_visible(True)
+        self.canvas_sensibilidade.draw_idle()
+
+    def criar_aba_analise(self):
+        """
+        Cria a aba de análise exploratória: uma estatística de uma nota agrupada por uma
+        ou duas dimensões, calculada a partir do cubo de agregados do preditor
+        """
+        controles = ttk.Frame(self.tab_analise)
+        controles.pack(fill="x", padx=10, pady=5)
+
+        dimensoes = list(self.nomes_dimensoes.values())
+        disciplinas = [self.nomes_disciplinas[coluna] for coluna in self.predictor.colunas_alvo] + ['Média Geral']
+        self.analise_linhas_var = tk.StringVar(value=self.nomes_dimensoes['SG_UF_ESC'])
+        self.analise_colunas_var = tk.StringVar(value=self.nomes_dimensoes['TP_DEPENDENCIA_ADM_ESC'])
+        self.analise_nota_var = tk.StringVar(value=self.nomes_disciplinas['NU_NOTA_MT'])
+        self.analise_estatistica_var = tk.StringVar(value='Média')
+
+        campos = [
+            ("Linhas:", self.analise_linhas_var, dimensoes),
+            ("Colunas:", self.analise_colunas_var, [self.SEM_COLUNAS] + dimensoes),
+            ("Nota:", self.analise_nota_var, disciplinas),
+            ("Estatística:", self.analise_estatistica_var, list(self.estatisticas_analise)),
+        ]
+        for coluna, (texto, variavel, valores) in enumerate(campos):
+            ttk.Label(controles, text=texto).grid(row=0, column=2 * coluna, padx=5, pady=5, sticky="w")
+            combo = ttk.Combobox(controles, textvariable=variavel, values=valores, state="readonly", width=20)
+            combo.grid(row=0, column=2 * coluna + 1, padx=5, pady=5, sticky="w")
+            combo.bind("<<ComboboxSelected>>", lambda evento: self.atualizar_analise())
+
+        self.figura_analise = Figure(figsize=(10, 6))
+        self.canvas_analise = FigureCanvasTkAgg(self.figura_analise, master=self.tab_analise)
+        self.canvas_analise.get_tk_widget().pack(fill="both", expand=True)
+        self.atualizar_analise()
+
+    def rotulo_valor(self, dimensao, valor):
+        """
+        Texto exibido para um valor de uma dimensão (o código do ENEM vira o seu nome)
+        """
+        opcoes = {
+            'TP_COR_RACA': self.opcoes_cor_raca,
+            'TP_ESCOLA': self.opcoes_tipo_escola,
+            'TP_ENSINO': self.opcoes_ensino,
+            'TP_DEPENDENCIA_ADM_ESC': self.opcoes_dependencia,
+            'TP_LOCALIZACAO_ESC': self.opcoes_localizacao,
+        }.get(dimensao, {})
+        texto = str(valor)
+        if texto == 'nan':
+            return "Não informado"
+        try:
+            texto = str(int(float(texto)))
+        except ValueError:
+            pass
+        return opcoes.get(texto, texto)
+
+    def tabela_analise(self):
+        """
+        Estatística escolhida na aba de análise, como um DataFrame (linhas x colunas)
+        """
+        codigo_dimensao = {nome: coluna for coluna, nome in self.nomes_dimensoes.items()}
+        codigo_disciplina = {nome: coluna for coluna, nome in self.nomes_disciplinas.items()}
+        linhas = codigo_dimensao[self.analise_linhas_var.get()]
+        colunas = codigo_dimensao.get(self.analise_colunas_var.get())
+        dimensoes = [linhas] if colunas in (None, linhas) else [linhas, colunas]
+
+        agregado = self.predictor.obter_cubo().agregar(dimensoes)
+        estatistica = self.estatisticas_analise[self.analise_estatistica_var.get()]
+        if estatistica is None:
+            valores = agregado['CONTAGEM']
+        else:
+            alvos = [codigo_disciplina.get(self.analise_nota_var.get())]
+            if alvos[0] is None:
+                alvos = self.predictor.colunas_alvo
+            valores = agregado[[f"{alvo}_{estatistica}" for alvo in alvos]].mean(axis=1)
+
+        tabela = valores.unstack() if len(dimensoes) == 2 else valores.to_frame(self.analise_nota_var.get())
+        tabela.index = [self.rotulo_valor(linhas, v) for v in tabela.index]
+        if len(dimensoes) == 2:
+            tabela.columns = [self.rotulo_valor(colunas, v) for v in tabela.columns]
+        return tabela
+
+    def atualizar_analise(self):
+        """
+        Redesenha a aba de análise: barras para uma dimensão, mapa de calor para duas
+        """
+        tabela = self.tabela_analise()
+        titulo = f"{self.analise_estatistica_var.get()} - {self.analise_nota_var.get()}"
+        if self.analise_estatistica_var.get() == 'Contagem':
+            titulo = "Número de participantes"
+
+        self.figura_analise.clear()
+        ax = self.figura_analise.add_subplot()
+        if tabela.shape[1] == 1:
+            ax.barh(tabela.index, tabela.iloc[:, 0].to_numpy(), color='skyblue')
+            ax.invert_yaxis()
+            ax.set_xlabel(titulo)
+        else:
+            imagem = ax.imshow(tabela.to_numpy(dtype=np.float64), aspect='auto', cmap='viridis')
+            ax.set_xticks(np.arange(tabela.shape[1]))
+            ax.set_xticklabels(tabela.columns, rotation=30, ha='right')
+            ax.set_yticks(np.arange(tabela.shape[0]))
+            ax.set_yticklabels(tabela.index)
+            self.figura_analise.colorbar(imagem, ax=ax, label=titulo)
+        ax.set_title(f"{titulo} por {self.analise_linhas_var.get()}"
+                     + (f" e {self.analise_colunas_var.get()}" if tabela.shape[1] > 1 else ""))
+        self.figura_analise.tight_layout()
+        self.canvas_analise.draw_idle()
+
+    @staticmethod
+    def atualizar_barras(bars, rotulos, valores):
+        """
+        Ajusta a altura de cada barra e reposiciona o seu rótulo de valor
+        """
+        for bar, rotulo, valor in zip(bars, rotulos, valores):
+            bar.set_height(valor)
+            rotulo.set_y(valor)
+            rotulo.set_text(f'{valor:.1f}')
@@ -0,0 +1,1881 @@
+import pandas as pd
+import numpy as np
+from sklearn.preprocessing import StandardScaler, LabelEncoder
+from sklearn.neighbors import KDTree
+from sklearn.model_selection import train_test_split, KFold
+import sklearn
+import joblib
+import time
+import os
+import json
+import hashlib
+import re
+import threading
+import multiprocessing
+import weakref
+import cProfile
+import io
+import pstats
+import tracemalloc
+from contextlib import contextmanager
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+
+# Versão do formato dos snapshots de modelo; incrementar ao mudar o conteúdo gravado
+VERSAO_SNAPSHOT = 4
+
+# Versão do formato do cache de pré-processamento; incrementar ao mudar o conteúdo gravado
+VERSAO_CACHE = 3
+
+
+def ano_do_arquivo(caminho):
+    """
+    Ano da edição do ENEM presente no nome do arquivo (MICRODADOS_ENEM_2023... -> 2023), ou 0
+    """
+    encontrado = re.search(r'(?<!\d)(?:19|20)\d{2}(?!\d)', os.path.basename(caminho))
+    return int(encontrado.group()) if encontrado else 0
+
+
+def hash_arquivo(caminho, tamanho_bloco=1 << 20):
+    """
+    Calcula o hash BLAKE2b de um arquivo lendo-o em blocos
+    """
+    h = hashlib.blake2b(digest_size=16)
+    with open(caminho, 'rb') as f:
+        for bloco in iter(lambda: f.read(tamanho_bloco), b''):
+            h.update(bloco)
+    return h.hexdigest()
+
+
+class RegressorVizinhos:
+    """
+    Regressor K-NN multi-alvo que consulta um índice de vizinhos já ajustado,
+    sem copiar nem reajustar os dados de treino.
+    As notas ficam numa matriz contígua (alvos x registros) em float32, de modo que uma
+    única busca de vizinhos atende todas as colunas alvo; as contas são feitas em float64
+    """
+    def __init__(self, indice, notas, k):
+        self.indice = indice
+        self.notas = notas
+        self.n_neighbors = k
+
+    def kneighbors(self, X, return_distance=True):
+        return self.indice.kneighbors(X, n_neighbors=self.n_neighbors,
+                                      return_distance=return_distance)
+
+    def notas_vizinhos(self, vizinhos_indices):
+        """
+        Retorna as notas dos vizinhos no formato (alvos, consultas, K)
+        """
+        return np.take(self.notas, vizinhos_indices, axis=1).astype(np.float64)
+
+    def predict(self, X):
+        if isinstance(self.indice, MotorPerfis):
+            return self.indice.prever(X, self.n_neighbors, self.notas).T
+
+        # Média ao longo do eixo contíguo, como no KNeighborsRegressor com pesos uniformes
+        vizinhos_indices = self.kneighbors(X, return_distance=False)
+        return np.mean(self.notas_vizinhos(vizinhos_indices), axis=2).T
+
+
+class IndiceArvore:
+    """
+    Índice de vizinhos sobre uma KDTree, com a mesma interface de NearestNeighbors.kneighbors
+    mas sem o despacho paralelo que o sklearn faz a cada consulta
+    """
+    def __init__(self, leaf_size=30):
+        self.leaf_size = leaf_size
+        self.arvore = None
+        self.n_registros = 0
+
+    def fit(self, X):
+        self.arvore = KDTree(X, leaf_size=self.leaf_size)
+        self.n_registros = len(X)
+        return self
+
+    def kneighbors(self, X, n_neighbors, return_distance=True):
+        if n_neighbors > self.n_registros:
+            raise ValueError(f"K={n_neighbors} maior que o número de registros ({self.n_registros})")
+        return self.arvore.query(np.asarray(X, dtype=np.float64), k=n_neighbors,
+                                 return_distance=return_distance)
+
+    def bytes_ocupados(self):
+        """
+        Memória dos arrays da árvore (pontos normalizados, permutação e nós)
+        """
+        return sum(np.asarray(a).nbytes for a in self.arvore.get_arrays())
+
+
+class MotorPerfis:
+    """
+    Motor K-NN exato que explora o espaço pequeno de perfis categóricos.
+    Os registros de treino são agrupados uma única vez por perfil (vetor de features),
+    guardando a contagem, a soma das notas e as posições dos registros de cada perfil.
+    Uma consulta percorre os perfis em ordem de distância até cobrir K registros,
+    com custo proporcional ao número de perfis e não ao número de registros.
+
+    Critério de desempate: perfis à mesma distância são percorridos na ordem
+    lexicográfica das suas coordenadas e, dentro de um perfil, os registros seguem
+    a ordem original do arquivo. Quando o último perfil não cabe inteiro, entram os
+    seus primeiros registros nessa ordem.
+    """
+    def __init__(self):
+        self.coordenadas = None
+        self.contagens = None
+        self.inicio = None
+        self.ordem = None
+        self.somas = None
+
+    def fit(self, X, notas):
+        """
+        Agrupa os registros normalizados X por perfil e acumula as notas (alvos x registros)
+        """
+        self.coordenadas, inverso, self.contagens = np.unique(
+            X, axis=0, return_inverse=True, return_counts=True)
+        inverso = inverso.ravel()
+
+        # Registros agrupados por perfil, preservando a ordem original dentro de cada perfil
+        tipo_indice = np.int32 if len(X) < np.iinfo(np.int32).max else np.int64
+        self.ordem = np.argsort(inverso, kind='stable').astype(tipo_indice)
+        self.inicio = np.concatenate(([0], np.cumsum(self.contagens)))
+        notas_agrupadas = np.take(notas, self.ordem, axis=1)
+        self.somas = np.add.reduceat(notas_agrupadas, self.inicio[:-1], axis=1, dtype=np.float64)
+        return self
+
+    def adicionar(self, X, notas):
+        """
+        Insere novos registros (numerados a partir do total atual) sem reagrupar os antigos:
+        cada registro novo entra no fim do segmento do seu perfil, o que mantém o critério
+        de desempate, e as somas e contagens dos perfis são apenas acrescidas.
+        X deve estar no mesmo espaço normalizado de coordenadas
+        """
+        n_antigos = len(self.ordem)
+        coordenadas_novas, inverso, contagens_novas = np.unique(
+            X, axis=0, return_inverse=True, return_counts=True)
+        inverso = inverso.ravel()
+
+        # Posição de cada perfil antigo e novo na lista combinada (ainda em ordem lexicográfica)
+        self.coordenadas, posicoes = np.unique(
+            np.vstack([self.coordenadas, coordenadas_novas]), axis=0, return_inverse=True)
+        posicoes = posicoes.ravel()
+        antigos, novos = posicoes[:len(self.contagens)], posicoes[len(self.contagens):]
+
+        contagens = np.zeros(len(self.coordenadas), dtype=np.int64)
+        contagens[antigos] = self.contagens
+        # Onde termina, na ordem antiga, o segmento de cada perfil combinado
+        fim_segmentos = np.cumsum(contagens)
+
+        ordem_novos = np.argsort(inverso, kind='stable')
+        tipo_indice = np.int32 if n_antigos + len(X) < np.iinfo(np.int32).max else np.int64
+        self.ordem = np.insert(self.ordem.astype(tipo_indice, copy=False),
+                               fim_segmentos[novos[inverso[ordem_novos]]],
+                               (ordem_novos + n_antigos).astype(tipo_indice))
+
+        inicio_novos = np.concatenate(([0], np.cumsum(contagens_novas)[:-1]))
+        somas = np.zeros((self.somas.shape[0], len(self.coordenadas)), dtype=np.float64)
+        somas[:, antigos] = self.somas
+        somas[:, novos] += np.add.reduceat(np.take(notas, ordem_novos, axis=1), inicio_novos, axis=1,
+                                           dtype=np.float64)
+        self.somas = somas
+
+        contagens[novos] += contagens_novas
+        self.contagens = contagens
+        self.inicio = np.concatenate(([0], np.cumsum(contagens)))
+        return self
+
+    def _percorrer_perfis(self, x, n_neighbors):
+        """
+        Retorna os perfis que cobrem os K vizinhos de x, suas distâncias e quantos
+        registros do último perfil entram na vizinhança
+        """
+        distancias = np.sqrt(((self.coordenadas - x) ** 2).sum(axis=1))
+
+        # Cada perfil tem ao menos um registro, então bastam os K perfis mais próximos
+        # (mais os empatados com o K-ésimo), ordenados de forma estável
+        if n_neighbors < len(distancias):
+            limite = np.partition(distancias, n_neighbors - 1)[n_neighbors - 1]
+            candidatos = np.flatnonzero(distancias <= limite)
+        else:
+            candidatos = np.arange(len(distancias))
+        perfis = candidatos[np.argsort(distancias[candidatos], kind='stable')]
+        acumulado = np.cumsum(self.contagens[perfis])
+        ultimo = int(np.searchsorted(acumulado, n_neighbors))
+        restante = n_neighbors - (acumulado[ultimo - 1] if ultimo > 0 else 0)
+        return perfis[:ultimo + 1], distancias, restante
+
+    def kneighbors(self, X, n_neighbors, return_distance=True):
+        """
+        Mesma interface do NearestNeighbors.kneighbors, com índices dos registros originais
+        """
+        X = np.asarray(X, dtype=np.float64)
+        if n_neighbors > len(self.ordem):
+            raise ValueError(f"K={n_neighbors} maior que o número de registros ({len(self.ordem)})")
+
+        indices = np.empty((len(X), n_neighbors), dtype=np.intp)
+        distancias = np.empty((len(X), n_neighbors), dtype=np.float64)
+        for i, x in enumerate(X):
+            perfis, distancias_perfis, restante = self._percorrer_perfis(x, n_neighbors)
+            # Perfis completos antes do último (juntos, menos de K registros) e só os
+            # primeiros registros do último: o custo não depende do tamanho dos perfis
+            ultimo = perfis[-1]
+            blocos = [self.ordem[self.inicio[p]:self.inicio[p + 1]] for p in perfis[:-1]]
+            blocos.append(self.ordem[self.inicio[ultimo]:self.inicio[ultimo] + restante])
+            indices[i] = np.concatenate(blocos)
+            repeticoes = self.contagens[perfis].copy()
+            repeticoes[-1] = restante
+            distancias[i] = np.repeat(distancias_perfis[perfis], repeticoes)
+
+        if return_distance:
+            return distancias, indices
+        return indices
+
+    def prever(self, X, n_neighbors, notas):
+        """
+        Média das notas dos K vizinhos a partir das somas por perfil, no formato (alvos, consultas)
+        """
+        X = np.asarray(X, dtype=np.float64)
+        if n_neighbors > len(self.ordem):
+            raise ValueError(f"K={n_neighbors} maior que o número de registros ({len(self.ordem)})")
+
+        previsoes = np.empty((self.somas.shape[0], len(X)), dtype=np.float64)
+        for i, x in enumerate(X):
+            perfis, _, restante = self._percorrer_perfis(x, n_neighbors)
+            ultimo = perfis[-1]
+            parcial = self.ordem[self.inicio[ultimo]:self.inicio[ultimo] + restante]
+            soma = (self.somas[:, perfis[:-1]].sum(axis=1)
+                    + np.take(notas, parcial, axis=1).sum(axis=1, dtype=np.float64))
+            previsoes[:, i] = soma / n_neighbors
+        return previsoes
+
+    def bytes_ocupados(self):
+        return sum(a.nbytes for a in (self.coordenadas, self.contagens, self.inicio, self.ordem, self.somas))
+
+
+# Estado do fragmento carregado em cada processo de busca
+_fragmento = {}
+
+
+def _iniciar_fragmento(nome_memoria, forma, inicio, fim, leaf_size):
+    """
+    Inicializador dos processos de busca: anexa a matriz de treino em memória
+    compartilhada e agrupa as linhas do fragmento por vetor de coordenadas, como o
+    MotorPerfis, com as posições de cada grupo em ordem crescente. A árvore é construída
+    apenas sobre os vetores distintos
+    """
+    memoria = shared_memory.SharedMemory(name=nome_memoria)
+    X = np.ndarray(forma, dtype=np.float64, buffer=memoria.buf)[inicio:fim]
+    vetores, inverso, contagens = np.unique(X, axis=0, return_inverse=True, return_counts=True)
+    _fragmento.update(memoria=memoria, arvore=KDTree(vetores, leaf_size=leaf_size), inicio=inicio,
+                      contagens=contagens, ordem=np.argsort(inverso.ravel(), kind='stable'),
+                      limites=np.concatenate(([0], np.cumsum(contagens))))
+
+
+def _consultar_fragmento(X, n_neighbors):
+    """
+    Top-K local do fragmento pela ordem (distância, posição do registro), com índices já
+    convertidos para a numeração global. Os vetores distintos são percorridos em ordem de
+    distância até cobrir K registros; entre os vetores empatados com o último, entram os
+    registros de menor posição
+    """
+    arvore, contagens, ordem, limites = (_fragmento[c] for c in ('arvore', 'contagens', 'ordem', 'limites'))
+    n_vetores = len(contagens)
+    k = min(n_neighbors, len(ordem))
+    distancias = np.empty((len(X), k), dtype=np.float64)
+    indices = np.empty((len(X), k), dtype=np.intp)
+
+    # Cada vetor tem ao menos um registro: K+1 vetores cobrem K registros e, quase sempre,
+    # mostram que não há mais vetores empatados com o último necessário
+    distancias_vetores, vizinhos_vetores = arvore.query(X, k=min(k + 1, n_vetores))
+    for i in range(len(X)):
+        d, v = distancias_vetores[i], vizinhos_vetores[i]
+        acumulado = np.cumsum(contagens[v])
+        ultimo = int(np.searchsorted(acumulado, k))
+        if ultimo == len(v) or (len(v) < n_vetores and d[-1] <= d[ultimo]):
+            d, v = (a[0] for a in arvore.query(X[i:i + 1], k=n_vetores))
+            acumulado = np.cumsum(contagens[v])
+            ultimo = int(np.searchsorted(acumulado, k))
+
+        limite = d[ultimo]
+        proximos = v[d < limite]
+        restante = k - int(contagens[proximos].sum())
+        # Os primeiros registros de cada vetor empatado bastam para achar os de menor posição
+        empatados = np.concatenate([ordem[limites[p]:min(limites[p] + restante, limites[p + 1])]
+                                    for p in v[d == limite]])
+        indices[i] = np.concatenate([ordem[limites[p]:limites[p + 1]] for p in proximos]
+                                    + [np.sort(empatados)[:restante]])
+        distancias[i] = np.concatenate([np.repeat(d[d < limite], contagens[proximos]),
+                                        np.full(restante, limite)])
+    return distancias, indices + _fragmento['inicio']
+
+
+def _fragmento_pronto():
+    """
+    Tarefa vazia enviada por fit() para iniciar o processo e agrupar as linhas do fragmento
+    """
+    return len(_fragmento['ordem'])
+
+
+class MotorFragmentado:
+    """
+    Motor K-NN que divide a matriz de treino em blocos contíguos de linhas, um por
+    processo. A matriz fica numa única cópia em memória compartilhada; cada processo
+    calcula o top-K local do seu fragmento e os resultados são combinados num top-K global.
+
+    Critério de desempate: vizinhos à mesma distância são ordenados pela posição do
+    registro nos dados de treino. Cada fragmento devolve o seu top-K exato nessa ordem
+    (a KDTree sozinha escolheria arbitrariamente entre os empatados), então o resultado
+    não depende de quantos processos dividem as linhas.
+
+    Os processos usam o método de início 'forkserver' ('spawn' onde ele não existe), e não
+    o fork padrão do Linux: fit() pode ser chamado de uma thread de trabalho com outras
+    threads ativas (interface, servidor), e um fork copiaria locks mantidos por elas
+    """
+    def __init__(self, n_processos=None, leaf_size=30):
+        self.n_processos = n_processos or os.cpu_count() or 1
+        self.leaf_size = leaf_size
+        self.memoria = None
+        self.executores = []
+        self.n_registros = 0
+        self._finalizador = None
+
+    def fit(self, X):
+        X = np.ascontiguousarray(X, dtype=np.float64)
+        self.n_registros = len(X)
+        self.memoria = shared_memory.SharedMemory(create=True, size=max(X.nbytes, 1))
+        np.ndarray(X.shape, dtype=np.float64, buffer=self.memoria.buf)[:] = X
+
+        limites = np.linspace(0, len(X), min(self.n_processos, max(len(X), 1)) + 1).astype(int)
+        if 'forkserver' in multiprocessing.get_all_start_methods():
+            contexto = multiprocessing.get_context('forkserver')
+            # O servidor importa este módulo (pandas, scikit-learn) uma vez; sem isso,
+            # cada processo de busca repetiria a importação
+            contexto.set_forkserver_preload([__name__])
+        else:
+            contexto = multiprocessing.get_context('spawn')
+        self.executores = [
+            ProcessPoolExecutor(max_workers=1, mp_context=contexto, initializer=_iniciar_fragmento,
+                                initargs=(self.memoria.name, X.shape, inicio, fim, self.leaf_size))
+            for inicio, fim in zip(limites[:-1], limites[1:])
+        ]
+        self._finalizador = weakref.finalize(self, MotorFragmentado._liberar, self.executores, self.memoria)
+
+        # Inicia os processos aqui, em paralelo, e não na primeira consulta: falhas do
+        # inicializador aparecem no fit() e as consultas não pagam a construção das árvores
+        tarefas = [executor.submit(_fragmento_pronto) for executor in self.executores]
+        for tarefa in tarefas:
+            tarefa.result()
+        return self
+
+    def kneighbors(self, X, n_neighbors, return_distance=True):
+        """
+        Mesma interface do NearestNeighbors.kneighbors
+        """
+        if n_neighbors > self.n_registros:
+            raise ValueError(f"K={n_neighbors} maior que o número de registros ({self.n_registros})")
+        X = np.asarray(X, dtype=np.float64)
+
+        tarefas = [executor.submit(_consultar_fragmento, X, n_neighbors) for executor in self.executores]
+        resultados = [tarefa.result() for tarefa in tarefas]
+        distancias = np.concatenate([d for d, _ in resultados], axis=1)
+        indices = np.concatenate([i for _, i in resultados], axis=1)
+
+        # Ordenar por distância e, nos empates, pela posição do registro
+        ordem = np.lexsort((indices, distancias))[:, :n_neighbors]
+        indices = np.take_along_axis(indices, ordem, axis=1)
+        if return_distance:
+            return np.take_along_axis(distancias, ordem, axis=1), indices
+        return indices
+
+    def bytes_ocupados(self):
+        """
+        Memória compartilhada com a matriz de treino; as árvores e os agrupamentos dos
+        fragmentos ficam nos processos de busca e não entram na conta
+        """
+        return self.memoria.size if self.memoria is not None else 0
+
+    @staticmethod
+    def _liberar(executores, memoria):
+        for executor in executores:
+            executor.shutdown(wait=True, cancel_futures=True)
+        memoria.close()
+        memoria.unlink()
+
+    def fechar(self):
+        """
+        Encerra os processos de busca e libera a memória compartilhada
+        """
+        if self._finalizador is not None:
+            self._finalizador()
+
+
+class TabelaNormalizacao:
+    """
+    Tabelas pré-calculadas que levam cada valor categórico bruto direto à sua
+    coordenada normalizada, a partir dos label_encoders e do scaler ajustado.
+    Valores desconhecidos (ou colunas ausentes) usam a coordenada da primeira
+    classe do encoder, como o fallback original de prever_notas
+    """
+    def __init__(self, colunas, label_encoders, scaler):
+        self.colunas = list(colunas)
+        self.classes = []
+        self.coordenadas = []
+        self.mapas = []
+        for j, coluna in enumerate(self.colunas):
+            classes = label_encoders[coluna].classes_
+            codigos = np.zeros((len(classes), len(self.colunas)), dtype=np.float64)
+            codigos[:, j] = np.arange(len(classes))
+            coordenadas = scaler.transform(codigos)[:, j].copy()
+
+            self.classes.append(pd.Index(classes))
+            self.coordenadas.append(coordenadas)
+            self.mapas.append(dict(zip(classes, coordenadas)))
+        self.padrao = np.array([coordenadas[0] for coordenadas in self.coordenadas])
+
+    def normalizar(self, dados_entrada):
+        """
+        Normaliza um único perfil (dicionário coluna -> valor), retornando um array (1, features)
+        """
+        return np.array([[mapa.get(dados_entrada.get(coluna), padrao)
+                          for coluna, mapa, padrao in zip(self.colunas, self.mapas, self.padrao)]])
+
+    def normalizar_lote(self, perfis):
+        """
+        Normaliza um DataFrame de perfis com uma busca vetorizada por coluna
+        """
+        X = np.tile(self.padrao, (len(perfis), 1))
+        for j, coluna in enumerate(self.colunas):
+            if coluna not in perfis:
+                continue
+            valores = perfis[coluna].astype(object).where(perfis[coluna].notna(), 'nan').astype(str)
+            codigos = self.classes[j].get_indexer(valores)
+            conhecidos = codigos >= 0
+            X[conhecidos, j] = self.coordenadas[j][codigos[conhecidos]]
+        return X
+
+
+class CachePrevisoes:
+    """
+    Cache LRU limitado dos resultados de prever_notas, indexado pelo modelo (features, K)
+    e pelo perfil codificado. Conta acertos, falhas e remoções
+    """
+    def __init__(self, capacidade=4096):
+        self.capacidade = capacidade
+        self._itens = OrderedDict()
+        self._trava = threading.Lock()
+        self.acertos = 0
+        self.falhas = 0
+        self.remocoes = 0
+
+    def obter(self, chave):
+        with self._trava:
+            previsoes = self._itens.get(chave)
+            if previsoes is None:
+                self.falhas += 1
+                return None
+            self._itens.move_to_end(chave)
+            self.acertos += 1
+        # Cópia rasa: quem chama pode alterar o dicionário sem afetar o cache
+        return dict(previsoes)
+
+    def guardar(self, chave, previsoes):
+        if self.capacidade <= 0:
+            return
+        for valor in previsoes.values():
+            if isinstance(valor, np.ndarray):
+                valor.flags.writeable = False
+        with self._trava:
+            self._itens[chave] = previsoes
+            self._itens.move_to_end(chave)
+            while len(self._itens) > self.capacidade:
+                self._itens.popitem(last=False)
+                self.remocoes += 1
+
+    def limpar(self):
+        with self._trava:
+            self._itens.clear()
+
+    def estatisticas(self):
+        with self._trava:
+            return {'acertos': self.acertos, 'falhas': self.falhas, 'remocoes': self.remocoes,
+                    'tamanho': len(self._itens), 'capacidade': self.capacidade}
+
+
+class CuboAgregado:
+    """
+    Agregados das notas por célula (combinação de valores das dimensões), calculados numa
+    única passada pelos registros: contagem e, para cada coluna alvo, soma, soma dos
+    quadrados e um histograma em faixas de LARGURA_FAIXA pontos, que serve de esboço
+    para os quantis. Como todos esses valores se somam, qualquer consolidação ou recorte
+    (por exemplo, média de matemática por UF e dependência administrativa) é respondido
+    somando as células, sem voltar aos registros
+    """
+    LARGURA_FAIXA = 10
+    N_FAIXAS = 100
+
+    def __init__(self, dimensoes, rotulos, colunas_alvo):
+        self.dimensoes = list(dimensoes)
+        # Valor de cada código, por dimensão
+        self.rotulos = {dimensao: list(rotulos[dimensao]) for dimensao in self.dimensoes}
+        self.colunas_alvo = list(colunas_alvo)
+        self.celulas = None
+        self.contagens = None
+        self.somas = None
+        self.somas_quadrados = None
+        self.histogramas = None
+
+    def construir(self, codigos, notas):
+        """
+        codigos: um array de códigos por dimensão; notas: matriz (alvos x registros)
+        """
+        tamanhos = [len(self.rotulos[dimensao]) for dimensao in self.dimensoes]
+        chaves, celula = np.unique(np.ravel_multi_index(list(codigos), tamanhos), return_inverse=True)
+        celula = celula.ravel()
+        n_celulas = len(chaves)
+        self.celulas = np.column_stack(np.unravel_index(chaves, tamanhos)).astype(np.uint16)
+        self.contagens = np.bincount(celula, minlength=n_celulas)
+
+        self.somas = np.empty((len(notas), n_celulas))
+        self.somas_quadrados = np.empty((len(notas), n_celulas))
+        self.histogramas = np.empty((len(notas), n_celulas, self.N_FAIXAS), dtype=np.uint32)
+        for i, nota in enumerate(notas):
+            nota = nota.astype(np.float64)
+            self.somas[i] = np.bincount(celula, weights=nota, minlength=n_celulas)
+            self.somas_quadrados[i] = np.bincount(celula, weights=nota * nota, minlength=n_celulas)
+            faixa = np.clip(nota // self.LARGURA_FAIXA, 0, self.N_FAIXAS - 1).astype(np.intp)
+            self.histogramas[i] = np.bincount(celula * self.N_FAIXAS + faixa,
+                                              minlength=n_celulas * self.N_FAIXAS).reshape(n_celulas, -1)
+        return self
+
+    def _somar_grupos(self, grupo, celulas):
+        """
+        Soma os agregados das células selecionadas por grupo (índices 0..n_grupos-1)
+        """
+        ordem = np.argsort(grupo, kind='stable')
+        inicio = np.flatnonzero(np.r_[True, np.diff(grupo[ordem]) != 0])
+        selecionadas = celulas[ordem]
+        return (np.add.reduceat(self.contagens[selecionadas], inicio),
+                np.add.reduceat(self.somas[:, selecionadas], inicio, axis=1),
+                np.add.reduceat(self.somas_quadrados[:, selecionadas], inicio, axis=1),
+                np.add.reduceat(self.histogramas[:, selecionadas], inicio, axis=1))
+
+    def combinar(self, outro):
+        """
+        Cubo com os registros dos dois cubos. Os códigos de cada dimensão são reunidos pelos
+        rótulos: os de self são mantidos e os rótulos novos de outro vêm em seguida
+        """
+        rotulos = {d: list(dict.fromkeys(self.rotulos[d] + outro.rotulos[d])) for d in self.dimensoes}
+        recodificadas = [self.celulas.astype(np.int64)]
+        celulas_outro = np.empty(outro.celulas.shape, dtype=np.int64)
+        for j, d in enumerate(self.dimensoes):
+            posicao = {r: i for i, r in enumerate(rotulos[d])}
+            mapa = np.array([posicao[r] for r in outro.rotulos[d]], dtype=np.int64)
+            celulas_outro[:, j] = mapa[outro.celulas[:, j]]
+        recodificadas.append(celulas_outro)
+
+        juntos = CuboAgregado(self.dimensoes, rotulos, self.colunas_alvo)
+        juntos.celulas = np.vstack(recodificadas)
+        juntos.contagens = np.concatenate([self.contagens, outro.contagens])
+        juntos.somas = np.hstack([self.somas, outro.somas])
+        juntos.somas_quadrados = np.hstack([self.somas_quadrados, outro.somas_quadrados])
+        juntos.histogramas = np.concatenate([self.histogramas, outro.histogramas], axis=1)
+
+        # Células presentes nos dois cubos viram uma só
+        juntos.celulas, grupo = np.unique(juntos.celulas, axis=0, return_inverse=True)
+        juntos.contagens, juntos.somas, juntos.somas_quadrados, juntos.histogramas = \
+            juntos._somar_grupos(grupo.ravel(), np.arange(len(grupo)))
+        juntos.celulas = juntos.celulas.astype(np.uint16)
+        return juntos
+
+    def estimar_quantil(self, histogramas, q):
+        """
+        Quantil q estimado de cada histograma (alvos x grupos x faixas), por interpolação
+        linear dentro da faixa. Em grupos grandes fica a menos de LARGURA_FAIXA pontos do
+        quantil exato; em grupos com poucos registros é apenas indicativo
+        """
+        acumulado = np.cumsum(histogramas, axis=2)
+        posicao = q * acumulado[:, :, -1:]
+        faixa = np.minimum((acumulado < posicao).sum(axis=2), self.N_FAIXAS - 1)
+        antes = np.where(faixa > 0, np.take_along_axis(acumulado, np.maximum(faixa - 1, 0)[..., None], 2)[..., 0], 0)
+        na_faixa = np.take_along_axis(histogramas, faixa[..., None], 2)[..., 0]
+        fracao = np.divide(posicao[..., 0] - antes, na_faixa, out=np.zeros(faixa.shape), where=na_faixa > 0)
+        return (faixa + fracao) * self.LARGURA_FAIXA
+
+    def agregar(self, dimensoes=(), filtros=None, quantis=(0.5,)):
+        """
+        Contagem e, para cada coluna alvo, média, desvio padrão e quantis agrupados pelas
+        dimensões pedidas (nenhuma: total geral). filtros: {dimensão: valores aceitos},
+        com os valores como nos dados (por exemplo {'SG_UF_ESC': ['SP', 'RJ']}).
+        Retorna um DataFrame indexado pelos valores das dimensões
+        """
+        mascara = np.ones(len(self.celulas), dtype=bool)
+        for dimensao, valores in (filtros or {}).items():
+            posicao = {str(r): i for i, r in enumerate(self.rotulos[dimensao])}
+            codigos = [posicao[str(v)] for v in valores if str(v) in posicao]
+            mascara &= np.isin(self.celulas[:, self.dimensoes.index(dimensao)], codigos)
+        celulas = np.flatnonzero(mascara)
+
+        colunas = [self.dimensoes.index(dimensao) for dimensao in dimensoes]
+        if colunas and len(celulas):
+            grupos, grupo = np.unique(self.celulas[np.ix_(celulas, colunas)], axis=0, return_inverse=True)
+        else:
+            grupos, grupo = np.zeros((min(len(celulas), 1), 0), dtype=np.uint16), np.zeros(len(celulas), dtype=np.intp)
+        if len(celulas):
+            contagens, somas, somas_quadrados, histogramas = self._somar_grupos(grupo.ravel(), celulas)
+        else:
+            contagens = np.zeros(0, dtype=np.int64)
+            somas = somas_quadrados = np.zeros((len(self.colunas_alvo), 0))
+            histogramas = np.zeros((len(self.colunas_alvo), 0, self.N_FAIXAS))
+
+        valores = [np.array(self.rotulos[d], dtype=object)[grupos[:, j]] for j, d in enumerate(dimensoes)]
+        if len(valores) > 1:
+            indice = pd.MultiIndex.from_arrays(valores, names=list(dimensoes))
+        elif valores:
+            indice = pd.Index(valores[0], name=dimensoes[0])
+        else:
+            indice = pd.RangeIndex(len(contagens))
+        resultado = pd.DataFrame({'CONTAGEM': contagens}, index=indice)
+        medias = somas / np.maximum(contagens, 1)
+        desvios = np.sqrt(np.maximum(somas_quadrados / np.maximum(contagens, 1) - medias ** 2, 0))
+        estimados = {q: self.estimar_quantil(histogramas, q) for q in quantis}
+        for i, coluna in enumerate(self.colunas_alvo):
+            resultado[f"{coluna}_MEDIA"] = medias[i]
+            resultado[f"{coluna}_DP"] = desvios[i]
+            for q, valores in estimados.items():
+                resultado[f"{coluna}_Q{round(100 * q)}"] = valores[i]
+        return resultado
+
+    def bytes_ocupados(self):
+        return sum(a.nbytes for a in (self.celulas, self.contagens, self.somas,
+                                      self.somas_quadrados, self.histogramas))
+
+
+class Metricas:
+    """
+    Instrumentação do preditor: tempo de cada etapa (chamadas, total e máximo) e contadores,
+    exportáveis em JSON ou no formato texto do Prometheus.
+    As etapas listadas em perfilar ('*' para todas) também rodam sob cProfile e tracemalloc;
+    o relatório da última execução de cada uma fica em relatorio_perfil
+    """
+    PREFIXO = 'enem_knn'
+
+    def __init__(self, perfilar=()):
+        self.perfilar = set(perfilar)
+        self.etapas = {}
+        self.contadores = {}
+        self.perfis = {}
+        self._trava = threading.Lock()
+        # cProfile não admite dois perfis ativos ao mesmo tempo: etapas aninhadas não são perfiladas
+        self._perfilando = False
+
+    @contextmanager
+    def etapa(self, nome):
+        perfil = None
+        if (nome in self.perfilar or '*' in self.perfilar) and not self._perfilando:
+            perfil = self._iniciar_perfil()
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            duracao = time.perf_counter() - inicio
+            if perfil is not None:
+                self._encerrar_perfil(nome, *perfil)
+            with self._trava:
+                etapa = self.etapas.setdefault(nome, {'chamadas': 0, 'segundos': 0.0, 'maximo_segundos': 0.0})
+                etapa['chamadas'] += 1
+                etapa['segundos'] += duracao
+                etapa['maximo_segundos'] = max(etapa['maximo_segundos'], duracao)
+
+    def contar(self, nome, valor=1):
+        with self._trava:
+            self.contadores[nome] = self.contadores.get(nome, 0) + valor
+
+    def _iniciar_perfil(self):
+        self._perfilando = True
+        rastreando = tracemalloc.is_tracing()
+        if rastreando:
+            tracemalloc.reset_peak()
+        else:
+            tracemalloc.start()
+        memoria_inicial = tracemalloc.get_traced_memory()[0]
+        perfil = cProfile.Profile()
+        perfil.enable()
+        return perfil, memoria_inicial, rastreando
+
+    def _encerrar_perfil(self, nome, perfil, memoria_inicial, rastreando):
+        perfil.disable()
+        atual, pico = tracemalloc.get_traced_memory()
+        if not rastreando:
+            tracemalloc.stop()
+        self._perfilando = False
+        self.perfis[nome] = {'perfil': perfil,
+                             'memoria_pico_bytes': pico - memoria_inicial,
+                             'memoria_retida_bytes': atual - memoria_inicial}
+
+    def relatorio_perfil(self, nome, linhas=25):
+        """
+        Funções mais custosas (tempo acumulado) e memória alocada na última execução perfilada da etapa
+        """
+        if nome not in self.perfis:
+            return f"Etapa {nome} não foi perfilada."
+        dados = self.perfis[nome]
+        texto = io.StringIO()
+        pstats.Stats(dados['perfil'], stream=texto).sort_stats('cumulative').print_stats(linhas)
+        return (f"Etapa {nome}: pico de memória {dados['memoria_pico_bytes'] / 2 ** 20:.1f} MiB, "
+                f"retida {dados['memoria_retida_bytes'] / 2 ** 20:.1f} MiB\n{texto.getvalue()}")
+
+    def instantaneo(self, contadores_extras=None):
+        with self._trava:
+            dados = {'etapas': {nome: dict(etapa) for nome, etapa in self.etapas.items()},
+                     'contadores': dict(self.contadores)}
+        dados['contadores'].update(contadores_extras or {})
+        dados['perfis'] = {nome: {'memoria_pico_bytes': perfil['memoria_pico_bytes'],
+                                  'memoria_retida_bytes': perfil['memoria_retida_bytes']}
+                           for nome, perfil in self.perfis.items()}
+        return dados
+
+    def exportar_json(self, contadores_extras=None):
+        return json.dumps(self.instantaneo(contadores_extras), ensure_ascii=False, indent=1)
+
+    def exportar_prometheus(self, contadores_extras=None):
+        dados = self.instantaneo(contadores_extras)
+        p = self.PREFIXO
+        linhas = [f"# TYPE {p}_etapa_chamadas_total counter",
+                  f"# TYPE {p}_etapa_segundos_total counter",
+                  f"# TYPE {p}_etapa_maximo_segundos gauge"]
+        for nome, etapa in sorted(dados['etapas'].items()):
+            linhas.append(f'{p}_etapa_chamadas_total{{etapa="{nome}"}} {etapa["chamadas"]}')
+            linhas.append(f'{p}_etapa_segundos_total{{etapa="{nome}"}} {etapa["segundos"]:.6f}')
+            linhas.append(f'{p}_etapa_maximo_segundos{{etapa="{nome}"}} {etapa["maximo_segundos"]:.6f}')
+        for nome, valor in sorted(dados['contadores'].items()):
+            linhas.append(f"# TYPE {p}_{nome}_total counter")
+            linhas.append(f"{p}_{nome}_total {valor}")
+        return "\n".join(linhas) + "\n"
+
+    def limpar(self):
+        with self._trava:
+            self.etapas.clear()
+            self.contadores.clear()
+            self.perfis.clear()
+
+
+class EnemKNNPredictor:
+    # Motores de busca de vizinhos disponíveis
+    MOTORES = ('indice', 'perfis', 'fragmentado')
+    # Estatísticas das notas dos vizinhos na previsão em lote ('' é a nota prevista)
+    ESTATISTICAS = {'': np.mean, 'DP': np.std, 'MIN': np.min, 'MAX': np.max}
+    # Dimensão do cubo de agregados com a edição do ENEM, além das colunas categóricas
+    DIMENSAO_ANO = 'NU_ANO'
+
+    def __init__(self, arquivo_csv, k_max=100, motor='indice', pasta_cache=None, usar_cache=True,
+                 tamanho_bloco=100_000, n_processos=None, tamanho_cache_previsoes=4096, perfilar=(),
+                 ano=None, max_indices_por_ano=8):
+        if motor not in self.MOTORES:
+            raise ValueError(f"Motor desconhecido: {motor}. Opções: {', '.join(self.MOTORES)}")
+        self.arquivo_csv = arquivo_csv
+        # Edição do ENEM dos registros de arquivo_csv (padrão: o ano no nome do arquivo)
+        self.ano = ano if ano is not None else ano_do_arquivo(arquivo_csv)
+        # Nomes dos arquivos cujos registros estão nos dados (o principal e os adicionados)
+        self.arquivos = []
+        # Pasta com os dados já tratados e codificados, reaproveitados entre execuções
+        self.pasta_cache = pasta_cache or f"{arquivo_csv}.cache"
+        self.usar_cache = usar_cache
+        # Linhas do CSV lidas por vez na ingestão. Blocos maiores não leem mais rápido e
+        # deixam mais memória fragmentada retida pelo processo depois da leitura
+        self.tamanho_bloco = tamanho_bloco
+        self.motor = motor
+        # Processos de busca do motor fragmentado (padrão: um por núcleo)
+        self.n_processos = n_processos
+        # Dados de treino numa única cópia compacta, compartilhada por todos os modelos:
+        # códigos das features (registros x features, uint8, uma coluna contígua por feature),
+        # notas (alvos x registros, float32) e a edição do ENEM de cada registro.
+        # O DataFrame da leitura não é mantido
+        self.codigos = None
+        self.notas = None
+        self.ano_registro = None
+        # Edições presentes em ano_registro, calculadas ao carregar ou acrescentar dados
+        # para que anos_disponiveis() não percorra todos os registros a cada consulta
+        self.edicoes = frozenset()
+        # Agregados das notas por combinação de features e edição, para a análise exploratória
+        self.cubo = None
+        self.scaler = StandardScaler()
+        self.tabela_normalizacao = None
+        self.label_encoders = {}
+        # Maior K atendido pelo índice sem reajuste
+        self.k_max = k_max
+        # Registro de índices de vizinhos, por (conjunto de features, anos):
+        # anos é None para todos os registros ou uma tupla de edições. Os índices filtrados
+        # por ano ficam em ordem de uso e, além de max_indices_por_ano, os menos usados
+        # recentemente são descartados (cada um guarda a sua cópia das notas)
+        self.indices = OrderedDict()
+        self.max_indices_por_ano = max_indices_por_ano
+        # Registro de modelos, por (conjunto de features, K, anos)
+        self.models = {}
+        self.modelo_atual = None
+        # Resultados recentes de prever_notas, por modelo e perfil codificado
+        self.cache_previsoes = CachePrevisoes(tamanho_cache_previsoes)
+        # Tempos por etapa e contadores; as etapas em perfilar rodam sob cProfile e tracemalloc
+        self.metricas = Metricas(perfilar)
+        self.colunas_categoricas = ['TP_COR_RACA', 'TP_ESCOLA', 'TP_ENSINO',
+                                    'SG_UF_ESC', 'TP_DEPENDENCIA_ADM_ESC',
+                                    'TP_LOCALIZACAO_ESC']
+        self.colunas_alvo = ['NU_NOTA_CN', 'NU_NOTA_CH', 'NU_NOTA_LC',
+                             'NU_NOTA_MT', 'NU_NOTA_REDACAO']
+
+    def invalidar_modelos(self):
+        """
+        Descarta os índices e modelos registrados. Deve ser chamado sempre que os dados mudarem
+        """
+        for _, indice, _, _ in self.indices.values():
+            if isinstance(indice, MotorFragmentado):
+                indice.fechar()
+        self.indices.clear()
+        self.models.clear()
+        self.cache_previsoes.limpar()
+        self.modelo_atual = None
+        self.scaler = StandardScaler()
+        self.tabela_normalizacao = None
+
+    @property
+    def n_registros(self):
+        return 0 if self.codigos is None else len(self.codigos)
+
+    def carregar_dados(self):
+        """
+        Carrega e faz o tratamento inicial dos dados do ENEM
+        """
+        print("Carregando dados...")
+        try:
+            self.invalidar_modelos()
+
+            if self.usar_cache:
+                with self.metricas.etapa('carga_cache'):
+                    carregado = self.carregar_cache()
+                if carregado:
+                    self.arquivos = [os.path.basename(self.arquivo_csv)]
+                    self.metricas.contar('registros_carregados', self.n_registros)
+                    self.edicoes = self.edicoes_de(self.ano_registro)
+                    self.cubo = self.construir_cubo(self.codigos, self.notas, self.ano_registro)
+                    print(f"Dados carregados do cache. Total de registros: {self.n_registros}")
+                    return True
+
+            (self.codigos, self.notas, self.ano_registro), self.label_encoders = \
+                self.ler_csv_em_blocos(self.arquivo_csv, ano=self.ano)
+            self.arquivos = [os.path.basename(self.arquivo_csv)]
+            self.metricas.contar('registros_carregados', self.n_registros)
+            self.edicoes = self.edicoes_de(self.ano_registro)
+            self.cubo = self.construir_cubo(self.codigos, self.notas, self.ano_registro)
+
+            if self.usar_cache:
+                with self.metricas.etapa('gravacao_cache'):
+                    self.salvar_cache()
+
+            print(f"Dados carregados com sucesso. Total de registros: {self.n_registros}")
+            return True
+        except Exception as e:
+            print(f"Erro ao carregar dados: {e}")
+            return False
+
+    def construir_cubo(self, codigos, notas, ano_registro):
+        """
+        Cubo de agregados das notas sobre as colunas categóricas e a edição, numa única
+        passada pelos registros dados
+        """
+        with self.metricas.etapa('construcao_cubo'):
+            anos, codigos_ano = np.unique(ano_registro, return_inverse=True)
+            rotulos = {coluna: [str(c) for c in self.label_encoders[coluna].classes_]
+                       for coluna in self.colunas_categoricas}
+            rotulos[self.DIMENSAO_ANO] = [int(ano) for ano in anos]
+            cubo = CuboAgregado(self.colunas_categoricas + [self.DIMENSAO_ANO], rotulos, self.colunas_alvo)
+            colunas = [codigos[:, j] for j in range(len(self.colunas_categoricas))] + [codigos_ano.ravel()]
+            return cubo.construir(colunas, notas)
+
+    def obter_cubo(self):
+        """
+        Cubo de agregados dos dados carregados. Depois de carregar_snapshot ele é
+        construído aqui, na primeira consulta
+        """
+        if self.cubo is None and self.codigos is not None:
+            self.cubo = self.construir_cubo(self.codigos, self.notas, self.ano_registro)
+        return self.cubo
+
+    def ler_csv_em_blocos(self, arquivo_csv, label_encoders=None, ano=0):
+        """
+        Lê apenas as colunas usadas pelo modelo, em blocos de tamanho_bloco linhas.
+        Cada bloco descarta os registros sem todas as notas numa única passada e tem as
+        colunas categóricas codificadas com um vocabulário incremental; o pico de memória
+        depende do tamanho do bloco e não do tamanho do arquivo.
+        Com label_encoders, as classes já conhecidas mantêm os seus códigos e as novas
+        recebem os códigos seguintes.
+        Retorna ((códigos, notas, ano de cada registro), label_encoders)
+        """
+        leitor = pd.read_csv(
+            arquivo_csv, sep=';', encoding='latin1',
+            usecols=self.colunas_categoricas + self.colunas_alvo,
+            dtype={**{c: str for c in self.colunas_categoricas},
+                   **{c: np.float32 for c in self.colunas_alvo}},
+            chunksize=self.tamanho_bloco)
+
+        # Vocabulário de cada coluna categórica: valor -> código provisório (ordem de aparição),
+        # começando pelas classes já conhecidas
+        label_encoders = label_encoders or {}
+        conhecidas = {coluna: [str(c) for c in label_encoders[coluna].classes_] if coluna in label_encoders else []
+                      for coluna in self.colunas_categoricas}
+        vocabularios = {coluna: {valor: i for i, valor in enumerate(conhecidas[coluna])}
+                        for coluna in self.colunas_categoricas}
+        codigos = {coluna: [] for coluna in self.colunas_categoricas}
+        notas = {coluna: [] for coluna in self.colunas_alvo}
+
+        while True:
+            with self.metricas.etapa('leitura_csv'):
+                bloco = next(leitor, None)
+            if bloco is None:
+                break
+            self.metricas.contar('linhas_lidas', len(bloco))
+
+            with self.metricas.etapa('filtragem'):
+                # Remover linhas com valores ausentes nas colunas alvo
+                completos = bloco[self.colunas_alvo].notna().all(axis=1).to_numpy()
+                bloco = bloco[completos]
+            self.metricas.contar('linhas_descartadas', int(len(completos) - completos.sum()))
+
+            for coluna in self.colunas_alvo:
+                notas[coluna].append(bloco[coluna].to_numpy(dtype=np.float32))
+
+            with self.metricas.etapa('codificacao'):
+                for coluna in self.colunas_categoricas:
+                    codigos_bloco, valores = pd.factorize(bloco[coluna].fillna('nan'))
+                    vocabulario = vocabularios[coluna]
+                    mapa = np.array([vocabulario.setdefault(v, len(vocabulario)) for v in valores],
+                                    dtype=np.uint16)
+                    codigos[coluna].append(mapa[codigos_bloco])
+
+        # Recodificar na ordem alfabética das classes, como o LabelEncoder; classes novas
+        # vêm depois das já conhecidas, que não mudam de código
+        colunas = []
+        novos_encoders = {}
+        with self.metricas.etapa('codificacao'):
+            for coluna in self.colunas_categoricas:
+                vocabulario = vocabularios[coluna]
+                classes = conhecidas[coluna] + sorted(set(vocabulario) - set(conhecidas[coluna]))
+                recodificacao = np.empty(len(classes), dtype=np.uint16)
+                for posicao, valor in enumerate(classes):
+                    recodificacao[vocabulario[valor]] = posicao
+                colunas.append(recodificacao[np.concatenate(codigos[coluna])])
+
+                le = LabelEncoder()
+                le.classes_ = np.array(classes, dtype=object)
+                novos_encoders[coluna] = le
+
+            # Uma matriz (registros x features) com o menor tipo que comporta todos os códigos,
+            # com cada feature contígua (ordem de Fortran), como as colunas de um DataFrame:
+            # o scaler soma os valores na mesma ordem e chega exatamente à mesma normalização
+            maior = max(len(le.classes_) for le in novos_encoders.values())
+            matriz_codigos = np.column_stack(colunas).astype(np.uint8 if maior <= 256 else np.uint16, order='F')
+
+        matriz_notas = np.vstack([np.concatenate(notas[coluna]) for coluna in self.colunas_alvo])
+        ano_registro = np.full(len(matriz_codigos), ano, dtype=np.uint16)
+        return (matriz_codigos, matriz_notas, ano_registro), novos_encoders
+
+    def _assinatura_csv(self):
+        """
+        Tamanho e data de modificação do CSV, usados na validação rápida do cache
+        """
+        info = os.stat(self.arquivo_csv)
+        return {'tamanho': info.st_size, 'mtime_ns': info.st_mtime_ns}
+
+    def salvar_cache(self):
+        """
+        Grava a matriz de códigos, a matriz de notas e os vocabulários
+        dos label_encoders na pasta de cache
+        """
+        try:
+            os.makedirs(self.pasta_cache, exist_ok=True)
+            arquivo_meta = os.path.join(self.pasta_cache, 'meta.json')
+
+            # O meta.json é gravado por último e marca o cache como completo
+            if os.path.exists(arquivo_meta):
+                os.remove(arquivo_meta)
+
+            np.save(os.path.join(self.pasta_cache, 'codigos.npy'), self.codigos)
+            np.save(os.path.join(self.pasta_cache, 'notas.npy'), self.notas)
+
+            vocabularios = {coluna: [str(c) for c in le.classes_]
+                            for coluna, le in self.label_encoders.items()}
+            with open(os.path.join(self.pasta_cache, 'vocabularios.json'), 'w', encoding='utf-8') as f:
+                json.dump(vocabularios, f, ensure_ascii=False)
+
+            meta = {
+                'versao': VERSAO_CACHE,
+                'colunas_categoricas': self.colunas_categoricas,
+                'colunas_alvo': self.colunas_alvo,
+                'registros': self.n_registros,
+                'hash': hash_arquivo(self.arquivo_csv),
+                **self._assinatura_csv(),
+            }
+            with open(arquivo_meta, 'w', encoding='utf-8') as f:
+                json.dump(meta, f)
+            return True
+        except Exception as e:
+            print(f"Aviso: não foi possível gravar o cache: {e}")
+            return False
+
+    def carregar_cache(self):
+        """
+        Carrega os dados da pasta de cache por memory-map, sem ler o CSV.
+        O cache é válido se tamanho e data de modificação do CSV coincidirem; caso contrário,
+        o hash do conteúdo decide (um CSV apenas "tocado" continua usando o cache)
+        """
+        arquivo_meta = os.path.join(self.pasta_cache, 'meta.json')
+        try:
+            if not os.path.exists(arquivo_meta):
+                return False
+            with open(arquivo_meta, encoding='utf-8') as f:
+                meta = json.load(f)
+
+            if (meta.get('versao') != VERSAO_CACHE
+                    or meta.get('colunas_categoricas') != self.colunas_categoricas
+                    or meta.get('colunas_alvo') != self.colunas_alvo):
+                return False
+
+            assinatura = self._assinatura_csv()
+            if assinatura['tamanho'] != meta['tamanho']:
+                return False
+            if assinatura['mtime_ns'] != meta['mtime_ns']:
+                if hash_arquivo(self.arquivo_csv) != meta['hash']:
+                    return False
+                meta.update(assinatura)
+                with open(arquivo_meta, 'w', encoding='utf-8') as f:
+                    json.dump(meta, f)
+
+            with open(os.path.join(self.pasta_cache, 'vocabularios.json'), encoding='utf-8') as f:
+                vocabularios = json.load(f)
+
+            self.codigos = np.asarray(np.load(os.path.join(self.pasta_cache, 'codigos.npy'), mmap_mode='r'))
+            self.notas = np.asarray(np.load(os.path.join(self.pasta_cache, 'notas.npy'), mmap_mode='r'))
+            self.ano_registro = np.full(meta['registros'], self.ano, dtype=np.uint16)
+
+            self.label_encoders = {}
+            for coluna, classes in vocabularios.items():
+                le = LabelEncoder()
+                le.classes_ = np.array(classes, dtype=object)
+                self.label_encoders[coluna] = le
+            return True
+        except Exception as e:
+            print(f"Aviso: cache inválido, recarregando o CSV: {e}")
+            return False
+
+    def salvar_snapshot(self, pasta):
+        """
+        Grava o estado do preditor já preparado (vocabulários, scaler, colunas codificadas,
+        matriz de notas e estrutura do índice de vizinhos) numa pasta, para ser carregado
+        por carregar_snapshot sem ler o CSV nem reconstruir o índice.
+        Os arrays ficam em formatos que podem ser abertos por memory-map
+        """
+        try:
+            if self.modelo_atual is None:
+                raise ValueError("Prepare o modelo antes de gravar o snapshot")
+            # O snapshot guarda o índice de todos os registros; os filtrados por ano são refeitos sob demanda
+            features, k_atual, _ = self.modelo_atual
+            if (features, None) not in self.indices:
+                modelo_atual = self.modelo_atual
+                if not self.preparar_modelo(k=k_atual):
+                    raise ValueError("Não foi possível preparar o índice completo")
+                self.modelo_atual = modelo_atual
+            scaler, indice, _, _ = self.indices[(features, None)]
+
+            os.makedirs(pasta, exist_ok=True)
+            arquivo_meta = os.path.join(pasta, 'meta.json')
+
+            # O meta.json é gravado por último e marca o snapshot como completo
+            if os.path.exists(arquivo_meta):
+                os.remove(arquivo_meta)
+
+            np.save(os.path.join(pasta, 'codigos.npy'), self.codigos)
+            np.save(os.path.join(pasta, 'notas.npy'), self.notas)
+            np.save(os.path.join(pasta, 'ano_registro.npy'), self.ano_registro)
+
+            vocabularios = {coluna: [str(c) for c in le.classes_]
+                            for coluna, le in self.label_encoders.items()}
+            with open(os.path.join(pasta, 'vocabularios.json'), 'w', encoding='utf-8') as f:
+                json.dump(vocabularios, f, ensure_ascii=False)
+
+            # O motor fragmentado vive em outros processos: grava-se a matriz de treino normalizada
+            if isinstance(indice, MotorFragmentado):
+                modelo = {'scaler': scaler,
+                          'X_treino': scaler.transform(self.codigos.astype(np.float64))}
+            else:
+                modelo = {'scaler': scaler, 'indice': indice}
+            joblib.dump(modelo, os.path.join(pasta, 'modelo.joblib'))
+
+            meta = {
+                'versao': VERSAO_SNAPSHOT,
+                'sklearn': sklearn.__version__,
+                'motor': self.motor,
+                'colunas_categoricas': self.colunas_categoricas,
+                'colunas_alvo': self.colunas_alvo,
+                'features': list(features),
+                'k_max': self.k_max,
+                'valores_k': sorted(k for f, k, anos in self.models if f == features and anos is None),
+                'k_atual': k_atual,
+                'registros': self.n_registros,
+                'arquivos': self.arquivos,
+                # CSV de origem, para que o snapshot não continue valendo depois que ele mudar
+                'csv': ({'hash': hash_arquivo(self.arquivo_csv), **self._assinatura_csv()}
+                        if os.path.exists(self.arquivo_csv) else None),
+            }
+            with open(arquivo_meta, 'w', encoding='utf-8') as f:
+                json.dump(meta, f)
+            print(f"Snapshot gravado em {pasta}.")
+            return True
+        except Exception as e:
+            print(f"Erro ao gravar snapshot: {e}")
+            return False
+
+    def carregar_snapshot(self, pasta):
+        """
+        Carrega um snapshot gravado por salvar_snapshot, com os arrays abertos por memory-map
+        somente leitura: vários processos que carregam o mesmo snapshot compartilham uma
+        única cópia física dos dados. O motor fragmentado é reconstruído a partir da matriz
+        de treino gravada.
+        Se o CSV de origem existir e tiver mudado (tamanho e data de modificação e, se só a
+        data mudou, o hash), o snapshot é ignorado. Se o motor configurado não for o do
+        snapshot, o índice desse motor é construído a partir dos dados do snapshot
+        """
+        arquivo_meta = os.path.join(pasta, 'meta.json')
+        try:
+            if not os.path.exists(arquivo_meta):
+                return False
+            with open(arquivo_meta, encoding='utf-8') as f:
+                meta = json.load(f)
+
+            if meta.get('versao') != VERSAO_SNAPSHOT:
+                print(f"Aviso: snapshot em formato antigo (versão {meta.get('versao')}), ignorado.")
+                return False
+            if meta.get('sklearn') != sklearn.__version__:
+                print(f"Aviso: snapshot gravado com scikit-learn {meta.get('sklearn')}, ignorado.")
+                return False
+            csv = meta.get('csv')
+            if csv is not None and os.path.exists(self.arquivo_csv):
+                assinatura = self._assinatura_csv()
+                if assinatura['tamanho'] != csv['tamanho'] or (
+                        assinatura['mtime_ns'] != csv['mtime_ns'] and hash_arquivo(self.arquivo_csv) != csv['hash']):
+                    print(f"Aviso: {self.arquivo_csv} mudou depois da gravação do snapshot, que será refeito.")
+                    return False
+                if assinatura['mtime_ns'] != csv['mtime_ns']:
+                    csv.update(assinatura)
+                    with open(arquivo_meta, 'w', encoding='utf-8') as f:
+                        json.dump(meta, f)
+
+            self.invalidar_modelos()
+            self.colunas_categoricas = meta['colunas_categoricas']
+            self.colunas_alvo = meta['colunas_alvo']
+            self.k_max = meta['k_max']
+            self.arquivos = meta['arquivos']
+
+            with open(os.path.join(pasta, 'vocabularios.json'), encoding='utf-8') as f:
+                vocabularios = json.load(f)
+            self.label_encoders = {}
+            for coluna, classes in vocabularios.items():
+                le = LabelEncoder()
+                le.classes_ = np.array(classes, dtype=object)
+                self.label_encoders[coluna] = le
+
+            self.codigos = np.asarray(np.load(os.path.join(pasta, 'codigos.npy'), mmap_mode='r'))
+            self.notas = np.asarray(np.load(os.path.join(pasta, 'notas.npy'), mmap_mode='r'))
+            self.ano_registro = np.asarray(np.load(os.path.join(pasta, 'ano_registro.npy'), mmap_mode='r'))
+            self.edicoes = self.edicoes_de(self.ano_registro)
+            self.cubo = None
+
+            modelo = joblib.load(os.path.join(pasta, 'modelo.joblib'), mmap_mode='r')
+            scaler = modelo['scaler']
+            if self.motor == meta['motor'] and 'indice' in modelo:
+                indice = modelo['indice']
+            else:
+                if self.motor != meta['motor']:
+                    print(f"Aviso: snapshot gravado com o motor {meta['motor']}; "
+                          f"construindo o índice do motor {self.motor}.")
+                X_treino = modelo.get('X_treino')
+                if X_treino is None:
+                    X_treino = scaler.transform(self.codigos.astype(np.float64))
+                indice = self.construir_indice(X_treino, self.notas)
+
+            features = tuple(meta['features'])
+            tabela = TabelaNormalizacao(features, self.label_encoders, scaler)
+            self.indices[(features, None)] = (scaler, indice, tabela, self.notas)
+            self.scaler = scaler
+            self.tabela_normalizacao = tabela
+            for k in meta['valores_k']:
+                self.models[(features, k, None)] = RegressorVizinhos(indice, self.notas, k)
+            self.modelo_atual = (features, meta['k_atual'], None)
+
+            print(f"Snapshot carregado de {pasta}. Total de registros: {self.n_registros}")
+            return True
+        except Exception as e:
+            print(f"Erro ao carregar snapshot: {e}")
+            self.invalidar_modelos()
+            return False
+
+    def relatorio_memoria(self):
+        """
+        Bytes ocupados por componente do preditor: matriz de códigos, matriz de notas,
+        edição de cada registro, cubo de agregados, índice de todos os registros e índices
+        filtrados por ano (com as suas cópias das notas). Arrays abertos por memory-map
+        entram pelo tamanho
+        """
+        relatorio = {
+            'codigos': 0 if self.codigos is None else self.codigos.nbytes,
+            'notas': 0 if self.notas is None else self.notas.nbytes,
+            'ano_registro': 0 if self.ano_registro is None else self.ano_registro.nbytes,
+            'cubo': 0 if self.cubo is None else self.cubo.bytes_ocupados(),
+            'indice': 0,
+            'indices_por_ano': 0,
+        }
+        for (_, anos), (_, indice, _, notas) in self.indices.items():
+            if anos is None:
+                relatorio['indice'] += indice.bytes_ocupados()
+            else:
+                relatorio['indices_por_ano'] += indice.bytes_ocupados() + notas.nbytes
+        relatorio['total'] = sum(relatorio.values())
+        return relatorio
+
+    def chave_modelo(self, k, anos=None):
+        """
+        Chave do registro de modelos: (features, K, anos), com anos None (todos os registros)
+        ou uma tupla ordenada de edições
+        """
+        anos = tuple(sorted({int(a) for a in anos})) if anos else None
+        return tuple(self.colunas_categoricas), k, anos
+
+    @staticmethod
+    def edicoes_de(ano_registro):
+        """
+        Conjunto das edições presentes num array de anos por registro
+        """
+        return frozenset(int(a) for a in np.unique(ano_registro))
+
+    def anos_disponiveis(self):
+        """
+        Edições presentes nos dados carregados (conjunto calculado na carga, sem custo por consulta)
+        """
+        return self.edicoes
+
+    def preparar_modelo(self, k=5, anos=None):
+        """
+        Prepara o modelo K-NN multi-alvo.
+        O índice de vizinhos é construído uma única vez por conjunto de features
+        e reaproveitado para qualquer K até k_max. Com anos, o índice cobre apenas
+        os registros dessas edições, no mesmo espaço normalizado do modelo completo
+        """
+        print("Preparando modelo K-NN...")
+        try:
+            if not 1 <= k <= self.k_max:
+                raise ValueError(f"K deve estar entre 1 e {self.k_max}")
+
+            # Selecionar features e target
+            chave = self.chave_modelo(k, anos)
+            features, _, anos = chave
+
+            if chave in self.models:
+                self.modelo_atual = chave
+                print("Modelos reaproveitados do registro.")
+                return True
+
+            if (features, anos) not in self.indices:
+                # A matriz de códigos já está na ordem das features; a cópia em float64
+                # só existe enquanto o índice é construído
+                X = self.codigos.astype(np.float64)
+
+                # Normalizar os dados (o scaler é ajustado uma vez e depois só atualizado)
+                with self.metricas.etapa('normalizacao'):
+                    if not hasattr(self.scaler, 'mean_'):
+                        self.scaler.fit(X)
+                    notas = self.notas
+                    if anos is not None:
+                        linhas = np.flatnonzero(np.isin(self.ano_registro, anos))
+                        if len(linhas) == 0:
+                            raise ValueError(f"Nenhum registro das edições {', '.join(map(str, anos))}")
+                        X = X[linhas]
+                        notas = np.ascontiguousarray(self.notas[:, linhas])
+                    X_scaled = self.scaler.transform(X)
+
+                # Construir o índice de vizinhos compartilhado
+                with self.metricas.etapa('construcao_indice'):
+                    indice = self.construir_indice(X_scaled, notas)
+                del X, X_scaled
+                if self.tabela_normalizacao is None:
+                    self.tabela_normalizacao = TabelaNormalizacao(features, self.label_encoders, self.scaler)
+                self.indices[(features, anos)] = (self.scaler, indice, self.tabela_normalizacao, notas)
+            if anos is not None:
+                self.indices.move_to_end((features, anos))
+                self.descartar_indices_por_ano(manter=(features, anos))
+
+            scaler, indice, tabela, notas = self.indices[(features, anos)]
+            if k > len(notas[0]):
+                raise ValueError(f"K={k} maior que o número de registros ({len(notas[0])})")
+            self.scaler = scaler
+            self.tabela_normalizacao = tabela
+
+            self.models[chave] = RegressorVizinhos(indice, notas, k)
+            self.modelo_atual = chave
+
+            print("Modelos preparados com sucesso.")
+            return True
+        except Exception as e:
+            print(f"Erro ao preparar modelo: {e}")
+            return False
+
+    def obter_modelo(self, chave):
+        """
+        Modelo registrado para a chave (features, K, anos). Modelos descartados por
+        adicionar_dados são reconstruídos aqui, na primeira consulta depois da mudança
+        """
+        if chave not in self.models:
+            modelo_atual = self.modelo_atual
+            if not self.preparar_modelo(k=chave[1], anos=chave[2]):
+                return None
+            self.modelo_atual = modelo_atual or chave
+        elif chave[2] is not None:
+            self.indices.move_to_end((chave[0], chave[2]))
+        return self.models[chave]
+
+    def descartar_indices_por_ano(self, manter=None):
+        """
+        Descarta os índices filtrados por ano menos usados recentemente (e os seus modelos)
+        até restarem max_indices_por_ano. O índice em manter e o do modelo atual ficam
+        """
+        protegidos = {manter}
+        if self.modelo_atual is not None:
+            protegidos.add((self.modelo_atual[0], self.modelo_atual[2]))
+        excedentes = sum(anos is not None for _, anos in self.indices) - self.max_indices_por_ano
+        for chave in [chave for chave in self.indices if chave[1] is not None and chave not in protegidos]:
+            if excedentes <= 0:
+                break
+            _, indice, _, _ = self.indices.pop(chave)
+            if isinstance(indice, MotorFragmentado):
+                indice.fechar()
+            for chave_modelo in [c for c in self.models if (c[0], c[2]) == chave]:
+                del self.models[chave_modelo]
+            self.metricas.contar('indices_por_ano_descartados')
+            excedentes -= 1
+
+    def adicionar_dados(self, arquivo_csv, ano=None):
+        """
+        Acrescenta os registros de outro CSV (nova edição ou lote corrigido) aos dados atuais,
+        com custo proporcional aos registros novos: os vocabulários dos label_encoders
+        ganham apenas as classes novas (os códigos antigos não mudam), o scaler é atualizado
+        com média e variância acumuladas (partial_fit) e o motor de perfis recebe os novos
+        registros sem ser reconstruído. Os índices em árvore e os filtrados por ano não
+        admitem inserção e são reconstruídos na próxima consulta
+        """
+        ano = ano if ano is not None else ano_do_arquivo(arquivo_csv)
+        print(f"Adicionando dados de {arquivo_csv} (edição {ano})...")
+        try:
+            with self.metricas.etapa('adicao_dados'):
+                (codigos_novos, notas_novas, anos_novos), label_encoders = \
+                    self.ler_csv_em_blocos(arquivo_csv, self.label_encoders, ano)
+                n_antigos = self.n_registros
+                self.codigos = np.asfortranarray(np.concatenate([self.codigos, codigos_novos]))
+                self.notas = np.concatenate([self.notas, notas_novas], axis=1)
+                self.ano_registro = np.concatenate([self.ano_registro, anos_novos])
+                self.edicoes = self.edicoes | self.edicoes_de(anos_novos)
+                self.label_encoders = label_encoders
+                self.arquivos.append(os.path.basename(arquivo_csv))
+                self.cache_previsoes.limpar()
+                self.metricas.contar('registros_carregados', len(codigos_novos))
+                if self.cubo is not None:
+                    self.cubo = self.cubo.combinar(self.construir_cubo(codigos_novos, notas_novas, anos_novos))
+
+                features = tuple(self.colunas_categoricas)
+                X_novo = codigos_novos.astype(np.float64)
+                completo = self.indices.pop((features, None), None)
+                for chave in list(self.indices):
+                    _, indice, _, _ = self.indices.pop(chave)
+                    if isinstance(indice, MotorFragmentado):
+                        indice.fechar()
+                self.models.clear()
+
+                if completo is not None and isinstance(completo[1], MotorPerfis):
+                    indice = completo[1]
+                    # Códigos dos perfis já agrupados, para reposicioná-los com o scaler atualizado
+                    codigos_perfis = np.rint(self.scaler.inverse_transform(indice.coordenadas))
+                    self.scaler.partial_fit(X_novo)
+                    indice.coordenadas = self.scaler.transform(codigos_perfis)
+                    indice.adicionar(self.scaler.transform(X_novo), notas_novas)
+                    self.tabela_normalizacao = TabelaNormalizacao(features, self.label_encoders, self.scaler)
+                    self.indices[(features, None)] = (self.scaler, indice, self.tabela_normalizacao, self.notas)
+                else:
+                    if completo is not None and isinstance(completo[1], MotorFragmentado):
+                        completo[1].fechar()
+                    self.tabela_normalizacao = None
+                    if hasattr(self.scaler, 'mean_'):
+                        self.scaler.partial_fit(X_novo)
+                        self.tabela_normalizacao = TabelaNormalizacao(features, self.label_encoders, self.scaler)
+
+                if self.modelo_atual is not None and (features, None) in self.indices:
+                    self.obter_modelo(self.modelo_atual)
+
+            print(f"Dados adicionados: {len(codigos_novos)} registros (total: {self.n_registros})")
+            return True
+        except Exception as e:
+            print(f"Erro ao adicionar dados: {e}")
+            return False
+
+    def construir_indice(self, X_scaled, notas):
+        """
+        Índice de vizinhos do motor configurado sobre a matriz de treino normalizada
+        """
+        if self.motor == 'perfis':
+            return MotorPerfis().fit(X_scaled, notas)
+        if self.motor == 'fragmentado':
+            return MotorFragmentado(self.n_processos).fit(X_scaled)
+        return IndiceArvore().fit(X_scaled)
+
+    def avaliar_k(self, k_max=None, tamanho_teste=0.2, n_folds=None, semente=42, tamanho_bloco=20_000):
+        """
+        Erro absoluto médio (MAE) e erro quadrático médio (MSE) de cada coluna alvo para
+        todo K de 1 a k_max, com uma parte dos dados separada para teste (ou validação
+        cruzada com n_folds partes).
+        Cada perfil de teste distinto é consultado uma única vez, com K = k_max; a previsão
+        para cada K sai das somas acumuladas das notas dos vizinhos, já ordenados por distância.
+        Retorna um DataFrame indexado por K
+        """
+        try:
+            k_max = k_max or self.k_max
+            X = self.codigos.astype(np.float64)
+            notas = self.notas
+            posicoes = np.arange(len(X))
+
+            if n_folds:
+                divisoes = KFold(n_splits=n_folds, shuffle=True, random_state=semente).split(posicoes)
+            else:
+                divisoes = [train_test_split(posicoes, test_size=tamanho_teste, random_state=semente)]
+
+            soma_abs = np.zeros((len(self.colunas_alvo), k_max))
+            soma_quad = np.zeros((len(self.colunas_alvo), k_max))
+            n_teste = 0
+            divisores = np.arange(1, k_max + 1)
+            with self.metricas.etapa('avaliacao'):
+                for treino, teste in divisoes:
+                    if k_max > len(treino):
+                        raise ValueError(f"K máximo ({k_max}) maior que o conjunto de treino ({len(treino)})")
+                    scaler = StandardScaler().fit(X[treino])
+                    notas_treino = np.ascontiguousarray(notas[:, treino])
+                    indice = self.construir_indice(scaler.transform(X[treino]), notas_treino)
+                    try:
+                        # Perfis de teste repetidos têm os mesmos vizinhos: uma consulta por perfil distinto
+                        perfis_teste, perfil_da_linha = np.unique(X[teste], axis=0, return_inverse=True)
+                        vizinhos = indice.kneighbors(scaler.transform(perfis_teste), n_neighbors=k_max,
+                                                     return_distance=False)
+                        # previsoes[alvo, perfil, K - 1] = média das notas dos K primeiros vizinhos
+                        previsoes = np.cumsum(np.take(notas_treino, vizinhos, axis=1), axis=2,
+                                              dtype=np.float64) / divisores
+                    finally:
+                        if isinstance(indice, MotorFragmentado):
+                            indice.fechar()
+
+                    for inicio in range(0, len(teste), tamanho_bloco):
+                        bloco = slice(inicio, inicio + tamanho_bloco)
+                        erros = (previsoes[:, perfil_da_linha.ravel()[bloco], :]
+                                 - notas[:, teste[bloco], np.newaxis])
+                        soma_abs += np.abs(erros).sum(axis=1)
+                        soma_quad += np.square(erros).sum(axis=1)
+                    n_teste += len(teste)
+                    self.metricas.contar('perfis_avaliados', len(perfis_teste))
+
+            resultado = pd.DataFrame(index=pd.RangeIndex(1, k_max + 1, name='K'))
+            for i, coluna in enumerate(self.colunas_alvo):
+                resultado[f"{coluna}_MAE"] = soma_abs[i] / n_teste
+                resultado[f"{coluna}_MSE"] = soma_quad[i] / n_teste
+            resultado['MEDIA_MAE'] = soma_abs.mean(axis=0) / n_teste
+            resultado['MEDIA_MSE'] = soma_quad.mean(axis=0) / n_teste
+            return resultado
+        except Exception as e:
+            print(f"Erro ao avaliar K: {e}")
+            return None
+
+    def prever_notas(self, dados_entrada):
+        """
+        Fazendo a previsão de notas utilizando o modelo K-NN
+        """
+        try:
+            # Codificar e normalizar com as tabelas pré-calculadas
+            dados_normalizados = self.tabela_normalizacao.normalizar(dados_entrada)
+            self.metricas.contar('consultas')
+
+            chave = (self.modelo_atual, tuple(dados_normalizados[0]))
+            previsoes = self.cache_previsoes.obter(chave)
+            if previsoes is not None:
+                return previsoes
+
+            previsoes = self._previsoes_por_perfil(dados_normalizados)[0]
+            self.cache_previsoes.guardar(chave, previsoes)
+            return dict(previsoes)
+        except Exception as e:
+            print(f"Erro ao prever notas: {e}")
+            return None
+
+    def _previsoes_por_perfil(self, X):
+        """
+        Monta o resultado de prever_notas para cada linha normalizada de X
+        """
+        # Uma única busca de vizinhos atende todas as colunas alvo
+        model = self.obter_modelo(self.modelo_atual)
+        with self.metricas.etapa('busca_vizinhos'):
+            vizinhos_indices = model.kneighbors(X, return_distance=False)
+
+        with self.metricas.etapa('montagem_resultado'):
+            notas_vizinhos = model.notas_vizinhos(vizinhos_indices)
+            medias = np.mean(notas_vizinhos, axis=2)
+
+            resultados = []
+            for j in range(len(X)):
+                previsoes = {}
+                for i, coluna_alvo in enumerate(self.colunas_alvo):
+                    previsoes[coluna_alvo] = medias[i, j]
+                    previsoes[f"{coluna_alvo}_vizinhos"] = notas_vizinhos[i, j]
+                resultados.append(previsoes)
+        return resultados
+
+    def aquecer_cache(self, n_perfis=256):
+        """
+        Pré-carrega o cache de previsões com os perfis mais frequentes nos dados de treino,
+        usando uma única busca de vizinhos em lote, para o modelo preparado por último
+        """
+        try:
+            n_perfis = min(n_perfis, self.cache_previsoes.capacidade)
+            if n_perfis <= 0:
+                return True
+            # Do menos ao mais frequente, para que os mais frequentes fiquem por último na fila LRU
+            perfis, contagens = np.unique(self.codigos, axis=0, return_counts=True)
+            frequentes = perfis[np.argsort(-contagens, kind='stable')[:n_perfis][::-1]]
+            X = np.column_stack([
+                self.tabela_normalizacao.coordenadas[j][frequentes[:, j]]
+                for j in range(len(self.colunas_categoricas))
+            ])
+            for x, previsoes in zip(X, self._previsoes_por_perfil(X)):
+                self.cache_previsoes.guardar((self.modelo_atual, tuple(x)), previsoes)
+            print(f"Cache de previsões aquecido com {len(X)} perfis.")
+            return True
+        except Exception as e:
+            print(f"Erro ao aquecer cache: {e}")
+            return False
+
+    def exportar_metricas(self, formato='json'):
+        """
+        Métricas do preditor em JSON ou no formato texto do Prometheus ('prometheus'),
+        incluindo os contadores do cache de previsões
+        """
+        cache = self.cache_previsoes.estatisticas()
+        extras = {f"cache_previsoes_{nome}": cache[nome] for nome in ('acertos', 'falhas', 'remocoes')}
+        if formato == 'prometheus':
+            return self.metricas.exportar_prometheus(extras)
+        return self.metricas.exportar_json(extras)
+
+    def prever_lote(self, perfis, tamanho_bloco=10_000, k=None, anos=None):
+        """
+        Prevê as notas de um DataFrame de perfis, consultando os vizinhos em blocos.
+        Retorna os perfis com, para cada coluna alvo, a nota prevista (sufixo _PREVISTA, para
+        não sobrescrever notas reais presentes na entrada) e o desvio padrão, o mínimo e o
+        máximo das notas dos K vizinhos. Sem k, usa o modelo preparado por último
+        """
+        try:
+            chave = self.modelo_atual if k is None else self.chave_modelo(k, anos)
+            model = self.obter_modelo(chave)
+            if model is None:
+                return None
+            X = self.tabela_normalizacao.normalizar_lote(perfis)
+            self.metricas.contar('perfis_lote', len(X))
+
+            estatisticas = {nome: np.empty((len(self.colunas_alvo), len(X))) for nome in self.ESTATISTICAS}
+            for inicio in range(0, len(X), tamanho_bloco):
+                fim = min(inicio + tamanho_bloco, len(X))
+                for nome, valores in self._estatisticas_vizinhos(model, X[inicio:fim]).items():
+                    estatisticas[nome][:, inicio:fim] = valores
+
+            saida = perfis.reset_index(drop=True).copy()
+            for i, coluna in enumerate(self.colunas_alvo):
+                saida[f"{coluna}_PREVISTA"] = estatisticas[''][i]
+                for nome in list(self.ESTATISTICAS)[1:]:
+                    saida[f"{coluna}_{nome}_VIZINHOS"] = estatisticas[nome][i]
+            saida['MEDIA_GERAL_PREVISTA'] = np.mean(estatisticas[''], axis=0)
+            return saida
+        except Exception as e:
+            print(f"Erro ao prever lote: {e}")
+            return None
+
+    def _estatisticas_vizinhos(self, model, X):
+        """
+        Nota prevista e desvio padrão, mínimo e máximo das notas dos K vizinhos
+        de cada linha normalizada de X, no formato (alvos, perfis)
+        """
+        with self.metricas.etapa('busca_vizinhos'):
+            vizinhos_indices = model.kneighbors(X, return_distance=False)
+        with self.metricas.etapa('montagem_resultado'):
+            notas_vizinhos = model.notas_vizinhos(vizinhos_indices)
+            return {nome: funcao(notas_vizinhos, axis=2) for nome, funcao in self.ESTATISTICAS.items()}
+
+    def prever_perfis(self, perfis, k, anos=None):
+        """
+        Variante de prever_lote para listas curtas de perfis (dicionários), sem DataFrame,
+        com os valores arredondados em 2 casas: usada pelo servidor HTTP
+        """
+        model = self.obter_modelo(self.chave_modelo(k, anos))
+        if model is None:
+            return None
+        X = np.vstack([self.tabela_normalizacao.normalizar(perfil) for perfil in perfis])
+        self.metricas.contar('perfis_lote', len(X))
+        estatisticas = self._estatisticas_vizinhos(model, X)
+        medias_gerais = np.mean(estatisticas[''], axis=0)
+
+        resultados = []
+        for j in range(len(X)):
+            resultado = {}
+            for i, coluna in enumerate(self.colunas_alvo):
+                for nome in self.ESTATISTICAS:
+                    resultado[f"{coluna}_{nome}_VIZINHOS" if nome else f"{coluna}_PREVISTA"] = round(
+                        float(estatisticas[nome][i, j]), 2)
+            resultado['MEDIA_GERAL_PREVISTA'] = round(float(medias_gerais[j]), 2)
+            resultados.append(resultado)
+        return resultados
+
+    def sensibilidade(self, dados_entrada, k=None, anos=None):
+        """
+        Análise "e se" de um perfil: gera todas as variações que trocam o valor de uma única
+        feature por cada classe do seu vocabulário, mantendo as demais, e prevê o perfil base
+        e todas as variações numa única busca de vizinhos.
+        Retorna um DataFrame indexado por (FEATURE, VALOR) com a nota prevista de cada coluna
+        alvo e a média geral, a diferença para o perfil base (sufixo _DELTA) e a coluna ATUAL,
+        que marca o valor do próprio perfil base. Sem k, usa o modelo preparado por último
+        """
+        try:
+            chave = self.modelo_atual if k is None else self.chave_modelo(k, anos)
+            model = self.obter_modelo(chave)
+            if model is None:
+                return None
+            tabela = self.tabela_normalizacao
+            base = tabela.normalizar(dados_entrada)[0]
+
+            # A primeira linha é o perfil base; depois, um bloco por feature com uma linha por classe
+            blocos = [base[np.newaxis]]
+            indice = []
+            atual = []
+            for j, coluna in enumerate(tabela.colunas):
+                variacoes = np.tile(base, (len(tabela.classes[j]), 1))
+                variacoes[:, j] = tabela.coordenadas[j]
+                blocos.append(variacoes)
+                indice.extend((coluna, valor) for valor in tabela.classes[j])
+                atual.extend(tabela.coordenadas[j] == base[j])
+            X = np.vstack(blocos)
+            self.metricas.contar('perfis_sensibilidade', len(X))
+
+            with self.metricas.etapa('busca_vizinhos'):
+                vizinhos_indices = model.kneighbors(X, return_distance=False)
+            with self.metricas.etapa('montagem_resultado'):
+                medias = np.mean(model.notas_vizinhos(vizinhos_indices), axis=2)
+                medias = np.vstack([medias, np.mean(medias, axis=0)])
+                # DataFrame montado de uma vez: inserir coluna a coluna custaria mais que a busca
+                colunas = {}
+                for i, coluna in enumerate(self.colunas_alvo + ['MEDIA_GERAL']):
+                    colunas[coluna] = medias[i, 1:]
+                    colunas[f"{coluna}_DELTA"] = medias[i, 1:] - medias[i, 0]
+                colunas['ATUAL'] = atual
+                return pd.DataFrame(colunas, index=pd.MultiIndex.from_tuples(indice, names=['FEATURE', 'VALOR']))
+        except Exception as e:
+            print(f"Erro na análise de sensibilidade: {e}")
+            return None
+
+    def prever_arquivo(self, arquivo_entrada, arquivo_saida, tamanho_bloco=100_000, sep=';'):
+        """
+        Prevê as notas de um arquivo CSV ou Parquet de perfis, gravando o resultado
+        bloco a bloco em CSV ou Parquet (conforme a extensão de arquivo_saida)
+        """
+        print(f"Prevendo notas em lote: {arquivo_entrada} -> {arquivo_saida}")
+        escritor = None
+        try:
+            if arquivo_entrada.endswith('.parquet'):
+                import pyarrow.parquet as pq
+                arquivo = pq.ParquetFile(arquivo_entrada)
+                blocos = (lote.to_pandas() for lote in arquivo.iter_batches(batch_size=tamanho_bloco))
+            else:
+                blocos = pd.read_csv(arquivo_entrada, sep=sep, dtype=str, chunksize=tamanho_bloco)
+
+            total = 0
+            while True:
+                with self.metricas.etapa('leitura_lote'):
+                    bloco = next(blocos, None)
+                if bloco is None:
+                    break
+                resultado = self.prever_lote(bloco)
+                if resultado is None:
+                    return False
+
+                with self.metricas.etapa('gravacao_lote'):
+                    if arquivo_saida.endswith('.parquet'):
+                        import pyarrow as pa
+                        import pyarrow.parquet as pq
+                        tabela = pa.Table.from_pandas(resultado, preserve_index=False)
+                        if escritor is None:
+                            escritor = pq.ParquetWriter(arquivo_saida, tabela.schema)
+                        escritor.write_table(tabela)
+                    else:
+                        resultado.to_csv(arquivo_saida, sep=sep, index=False, float_format='%.2f',
+                                         mode='w' if total == 0 else 'a', header=total == 0)
+                total += len(resultado)
+                print(f"{total} perfis processados...")
+
+            print(f"Previsão em lote concluída. Total de perfis: {total}")
+            return True
+        except Exception as e:
+            print(f"Erro ao prever arquivo: {e}")
+            return False
+        finally:
+            if escritor is not None:
+                escritor.close()
+
+
+def criar_preditor(args, k=5, aquecer_cache=0):
+    """
+    Cria o preditor com o modelo preparado para K. Com --snapshot, carrega o snapshot
+    se ele existir; caso contrário, lê o CSV e grava o snapshot para as próximas execuções.
+    Com aquecer_cache, pré-carrega o cache de prever_notas com esse número de perfis frequentes
+    """
+    predictor = EnemKNNPredictor(args.dados, motor=args.motor, n_processos=args.processos,
+                                 perfilar=args.perfilar or ())
+    do_snapshot = bool(args.snapshot) and predictor.carregar_snapshot(args.snapshot)
+    if not do_snapshot and not predictor.carregar_dados():
+        return None
+
+    # Arquivos de --adicionar que o snapshot já contém não são acrescentados de novo
+    novos = [arquivo for arquivo in args.adicionar or ()
+             if os.path.basename(arquivo) not in predictor.arquivos]
+    for arquivo in novos:
+        if not predictor.adicionar_dados(arquivo):
+            return None
+    if not predictor.preparar_modelo(k=k, anos=args.anos):
+        return None
+    if args.snapshot and (novos or not do_snapshot):
+        predictor.salvar_snapshot(args.snapshot)
+    if aquecer_cache:
+        predictor.aquecer_cache(aquecer_cache)
+    return predictor
+
+
+def gravar_metricas(predictor, args):
+    """
+    Grava as métricas em --metricas (formato Prometheus se o arquivo terminar em .prom,
+    JSON caso contrário), imprime o perfil das etapas de --perfilar e, com --memoria,
+    a memória ocupada por componente
+    """
+    if args.metricas:
+        formato = 'prometheus' if args.metricas.endswith('.prom') else 'json'
+        with open(args.metricas, 'w', encoding='utf-8') as f:
+            f.write(predictor.exportar_metricas(formato))
+        print(f"Métricas gravadas em {args.metricas}")
+    for etapa in args.perfilar or ():
+        nomes = predictor.metricas.perfis if etapa == '*' else [etapa]
+        for nome in list(nomes):
+            print(predictor.metricas.relatorio_perfil(nome))
+    if args.memoria:
+        for componente, tamanho in predictor.relatorio_memoria().items():
+            print(f"Memória {componente}: {tamanho / 2 ** 20:.1f} MiB")
+
+
+def executar_lote(args):
+    """
+    Modo sem interface gráfica: carrega os dados, prepara o modelo e prevê um arquivo de perfis
+    """
+    predictor = criar_preditor(args, k=args.k)
+    if predictor is None:
+        return 1
+    saida = args.saida or f"{os.path.splitext(args.lote)[0]}_previsoes.csv"
+    sucesso = predictor.prever_arquivo(args.lote, saida)
+    gravar_metricas(predictor, args)
+    return 0 if sucesso else 1
+
+
+def executar_avaliacao(args):
+    """
+    Modo sem interface gráfica: erro de previsão para cada K de 1 a --avaliar
+    """
+    predictor = EnemKNNPredictor(args.dados, motor=args.motor, n_processos=args.processos,
+                                 perfilar=args.perfilar or ())
+    if not predictor.carregar_dados():
+        return 1
+    resultado = predictor.avaliar_k(args.avaliar, n_folds=args.folds)
+    if resultado is None:
+        return 1
+
+    colunas = ['MEDIA_MAE', 'MEDIA_MSE'] + [f"{c}_MAE" for c in predictor.colunas_alvo]
+    print(resultado[colunas].round(2).to_string())
+    print(f"Melhor K pelo MAE médio: {resultado['MEDIA_MAE'].idxmin()} | "
+          f"pelo MSE médio: {resultado['MEDIA_MSE'].idxmin()}")
+    if args.saida:
+        resultado.to_csv(args.saida, sep=';')
+        print(f"Resultado gravado em {args.saida}")
+    gravar_metricas(predictor, args)
+    return 0
+
+
+def executar_agregacao(args):
+    """
+    Modo sem interface gráfica: média, desvio padrão e mediana de cada nota agrupados
+    pelas dimensões de --agregar, a partir do cubo de agregados
+    """
+    predictor = EnemKNNPredictor(args.dados, perfilar=args.perfilar or ())
+    if not predictor.carregar_dados():
+        return 1
+    for arquivo in args.adicionar or ():
+        if not predictor.adicionar_dados(arquivo):
+            return 1
+
+    cubo = predictor.obter_cubo()
+    desconhecidas = [d for d in args.agregar if d not in cubo.dimensoes]
+    if desconhecidas:
+        print(f"Dimensões desconhecidas: {', '.join(desconhecidas)}. Opções: {', '.join(cubo.dimensoes)}")
+        return 1
+    filtros = {predictor.DIMENSAO_ANO: args.anos} if args.anos else None
+    resultado = cubo.agregar(args.agregar, filtros)
+
+    colunas = ['CONTAGEM'] + [f"{c}_MEDIA" for c in predictor.colunas_alvo]
+    print(resultado[colunas].round(1).to_string())
+    if args.saida:
+        resultado.to_csv(args.saida, sep=';')
+        print(f"Resultado gravado em {args.saida}")
+    gravar_metricas(predictor, args)
+    return 0
+
+
+def executar_sensibilidade(args):
+    """
+    Modo sem interface gráfica: variação das notas previstas quando se troca o valor de
+    uma única feature do perfil dado em --sensibilidade (pares COLUNA=VALOR)
+    """
+    predictor = criar_preditor(args, k=args.k)
+    if predictor is None:
+        return 1
+
+    dados_entrada = {}
+    for par in args.sensibilidade:
+        coluna, _, valor = par.partition('=')
+        if coluna not in predictor.colunas_categoricas:
+            print(f"Coluna desconhecida: {coluna}. Opções: {', '.join(predictor.colunas_categoricas)}")
+            return 1
+        classes = [str(c) for c in predictor.label_encoders[coluna].classes_]
+        if valor not in classes:
+            print(f"Aviso: valor {valor} desconhecido para {coluna}; usando {classes[0]}. Opções: {', '.join(classes)}")
+        dados_entrada[coluna] = valor
+
+    resultado = predictor.sensibilidade(dados_entrada)
+    if resultado is None:
+        return 1
+
+    colunas = [f"{c}_DELTA" for c in predictor.colunas_alvo + ['MEDIA_GERAL']]
+    print(f"Média geral prevista do perfil base: {resultado['MEDIA_GERAL'][resultado['ATUAL']].iloc[0]:.1f}")
+    print(resultado[colunas + ['ATUAL']].round(1).to_string())
+    if args.saida:
+        resultado.to_csv(args.saida, sep=';')
+        print(f"Resultado gravado em {args.saida}")
+    gravar_metricas(predictor, args)
+    return 0
@@ -0,0 +1,291 @@
+import argparse
+import asyncio
+import json
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+from preditor import EnemKNNPredictor, criar_preditor
+
+
+class SobrecargaError(Exception):
+    """
+    A fila de previsões pendentes está cheia
+    """
+
+
+class ServidorPrevisoes:
+    """
+    Serviço HTTP/JSON de previsão de notas, sem interface gráfica.
+    Requisições que chegam dentro de uma janela curta são agrupadas numa única
+    consulta de vizinhos em lote; o número de perfis pendentes é limitado
+    e, acima do limite, novas requisições recebem 503
+    """
+    TAMANHO_MAX_CORPO = 1 << 20
+
+    def __init__(self, predictor, k_padrao=5, janela_ms=2.0, tamanho_max_lote=2048, max_pendentes=20_000,
+                 anos_padrao=None):
+        self.predictor = predictor
+        self.k_padrao = k_padrao
+        self.anos_padrao = anos_padrao
+        self.janela = janela_ms / 1000
+        self.tamanho_max_lote = tamanho_max_lote
+        self.max_pendentes = max_pendentes
+        self.pendentes = 0
+        self.fila = None
+        # Uma única thread de cálculo: o preditor não é compartilhado entre threads
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        self.lotes = 0
+        self.previsoes = 0
+        self.rejeitadas = 0
+
+    async def prever(self, perfis, k, anos=None):
+        """
+        Enfileira perfis para o próximo lote e aguarda as suas previsões
+        """
+        if self.pendentes + len(perfis) > self.max_pendentes:
+            self.rejeitadas += len(perfis)
+            raise SobrecargaError()
+        self.pendentes += len(perfis)
+        futuro = asyncio.get_running_loop().create_future()
+        self.fila.put_nowait((perfis, (k, anos), futuro))
+        try:
+            return await futuro
+        finally:
+            self.pendentes -= len(perfis)
+
+    async def agrupar_requisicoes(self):
+        """
+        Junta as requisições que chegam dentro da janela (ou até o tamanho máximo do lote)
+        e calcula cada lote na thread de cálculo
+        """
+        loop = asyncio.get_running_loop()
+        while True:
+            lote = [await self.fila.get()]
+            total = len(lote[0][0])
+            limite = loop.time() + self.janela
+            while total < self.tamanho_max_lote:
+                restante = limite - loop.time()
+                if restante <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self.fila.get(), restante)
+                except asyncio.TimeoutError:
+                    break
+                lote.append(item)
+                total += len(item[0])
+
+            try:
+                resultados = await loop.run_in_executor(self.executor, self.processar_lote, lote)
+            except Exception as e:
+                resultados = [e] * len(lote)
+            for (_, _, futuro), resultado in zip(lote, resultados):
+                if futuro.done():
+                    continue
+                if isinstance(resultado, Exception):
+                    futuro.set_exception(resultado)
+                else:
+                    futuro.set_result(resultado)
+
+    def processar_lote(self, lote):
+        """
+        Uma consulta de vizinhos por combinação de K e edições presente no lote
+        """
+        resultados = [None] * len(lote)
+        por_modelo = {}
+        for posicao, (perfis, modelo, _) in enumerate(lote):
+            por_modelo.setdefault(modelo, []).append(posicao)
+
+        for (k, anos), posicoes in por_modelo.items():
+            perfis = [perfil for posicao in posicoes for perfil in lote[posicao][0]]
+            linhas = self.predictor.prever_perfis(perfis, k, anos)
+            if linhas is None:
+                for posicao in posicoes:
+                    resultados[posicao] = ValueError("Não foi possível fazer a previsão. Verifique os dados.")
+                continue
+
+            inicio = 0
+            for posicao in posicoes:
+                n = len(lote[posicao][0])
+                resultados[posicao] = linhas[inicio:inicio + n]
+                inicio += n
+
+        self.lotes += 1
+        self.previsoes += sum(len(perfis) for perfis, _, _ in lote)
+        return resultados
+
+    async def atender_conexao(self, leitor, escritor):
+        """
+        Atende requisições HTTP/1.1 (com keep-alive) numa conexão
+        """
+        try:
+            while True:
+                linha = await leitor.readline()
+                if not linha:
+                    break
+                try:
+                    metodo, caminho, _ = linha.decode('latin1').split(' ', 2)
+                except ValueError:
+                    await self.responder(escritor, 400, {'erro': 'Requisição inválida'}, fechar=True)
+                    break
+
+                cabecalhos = {}
+                while True:
+                    linha = await leitor.readline()
+                    if linha in (b'\r\n', b'\n', b''):
+                        break
+                    nome, _, valor = linha.decode('latin1').partition(':')
+                    cabecalhos[nome.strip().lower()] = valor.strip()
+
+                try:
+                    tamanho = int(cabecalhos.get('content-length', '0') or '0')
+                    if tamanho < 0:
+                        raise ValueError()
+                except ValueError:
+                    await self.responder(escritor, 400, {'erro': 'Content-Length inválido'}, fechar=True)
+                    break
+                if tamanho > self.TAMANHO_MAX_CORPO:
+                    await self.responder(escritor, 413, {'erro': 'Corpo da requisição muito grande'}, fechar=True)
+                    break
+                corpo = await leitor.readexactly(tamanho) if tamanho else b''
+                fechar = cabecalhos.get('connection', '').lower() == 'close'
+
+                status, resposta = await self.rotear(metodo, caminho, corpo)
+                await self.responder(escritor, status, resposta, fechar=fechar)
+                if fechar:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            escritor.close()
+
+    @staticmethod
+    def valor_perfil(coluna, valor):
+        """
+        Valor de uma coluna do perfil no formato dos vocabulários (texto, como na leitura do
+        CSV; null vira 'nan'). Listas, objetos e booleanos são rejeitados
+        """
+        if valor is None:
+            return 'nan'
+        if isinstance(valor, bool) or not isinstance(valor, (str, int, float)):
+            raise ValueError(f"Valor inválido para {coluna}: use texto, número ou null")
+        return str(valor)
+
+    async def rotear(self, metodo, caminho, corpo):
+        if metodo == 'GET' and caminho == '/saude':
+            return 200, {'status': 'ok', 'pendentes': self.pendentes, 'lotes': self.lotes,
+                         'previsoes': self.previsoes, 'rejeitadas': self.rejeitadas}
+        if metodo == 'GET' and caminho == '/metricas':
+            return 200, self.predictor.exportar_metricas('prometheus')
+        if metodo != 'POST' or caminho != '/prever':
+            return 404, {'erro': 'Use POST /prever, GET /saude ou GET /metricas'}
+
+        try:
+            dados = json.loads(corpo or b'{}')
+            if not isinstance(dados, dict):
+                raise ValueError("Envie um perfil ou {\"perfis\": [...]} como objeto JSON")
+            unico = 'perfis' not in dados
+            perfis = [dados] if unico else dados['perfis']
+            if not isinstance(perfis, list) or not perfis or not all(isinstance(p, dict) for p in perfis):
+                raise ValueError("\"perfis\" deve ser uma lista não vazia de objetos")
+            k = dados.get('k', self.k_padrao)
+            if isinstance(k, bool) or not isinstance(k, int):
+                raise ValueError("\"k\" deve ser um número inteiro")
+            anos = dados.get('anos', self.anos_padrao)
+            if anos is not None:
+                if (not isinstance(anos, list) or not anos
+                        or any(isinstance(ano, bool) or not isinstance(ano, int) for ano in anos)):
+                    raise ValueError("\"anos\" deve ser uma lista não vazia de edições (números inteiros)")
+                anos = tuple(sorted(set(anos)))
+            perfis = [{c: self.valor_perfil(c, p[c]) for c in self.predictor.colunas_categoricas if c in p}
+                      for p in perfis]
+        except (ValueError, TypeError, OverflowError) as e:
+            return 400, {'erro': str(e)}
+
+        if not 1 <= k <= self.predictor.k_max:
+            return 400, {'erro': f"K deve estar entre 1 e {self.predictor.k_max}"}
+        if anos is not None and not set(anos) <= self.predictor.anos_disponiveis():
+            return 400, {'erro': f"Edições disponíveis: {sorted(self.predictor.anos_disponiveis())}"}
+
+        try:
+            resultado = await self.prever(perfis, k, anos)
+        except SobrecargaError:
+            return 503, {'erro': 'Servidor sobrecarregado, tente novamente'}
+        except Exception as e:
+            return 500, {'erro': str(e)}
+        return 200, resultado[0] if unico else {'previsoes': resultado}
+
+    @staticmethod
+    async def responder(escritor, status, dados, fechar=False):
+        motivos = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 413: 'Payload Too Large',
+                   500: 'Internal Server Error', 503: 'Service Unavailable'}
+        # Texto puro (métricas no formato Prometheus) ou JSON
+        if isinstance(dados, str):
+            corpo, tipo = dados.encode('utf-8'), "text/plain; version=0.0.4; charset=utf-8"
+        else:
+            corpo, tipo = json.dumps(dados, ensure_ascii=False).encode('utf-8'), "application/json; charset=utf-8"
+        cabecalhos = [
+            f"HTTP/1.1 {status} {motivos[status]}",
+            f"Content-Type: {tipo}",
+            f"Content-Length: {len(corpo)}",
+            f"Connection: {'close' if fechar else 'keep-alive'}",
+        ]
+        if status == 503:
+            cabecalhos.append("Retry-After: 1")
+        escritor.write(("\r\n".join(cabecalhos) + "\r\n\r\n").encode('latin1') + corpo)
+        await escritor.drain()
+
+    async def iniciar(self, host='127.0.0.1', porta=8080):
+        """
+        Inicia o servidor e a tarefa de agrupamento; retorna o asyncio.Server
+        """
+        self.fila = asyncio.Queue()
+        self.tarefa_agrupamento = asyncio.create_task(self.agrupar_requisicoes())
+        return await asyncio.start_server(self.atender_conexao, host, porta)
+
+
+async def servir(servidor, host, porta):
+    servidor_http = await servidor.iniciar(host, porta)
+    print(f"Servidor de previsões em http://{host}:{porta} (POST /prever, GET /saude, GET /metricas)")
+    async with servidor_http:
+        await servidor_http.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Servidor HTTP de previsão de notas do ENEM")
+    parser.add_argument("--dados", default="MICRODADOS_ENEM_2023_EDITADO.csv",
+                        help="CSV com os microdados do ENEM")
+    parser.add_argument("--motor", choices=EnemKNNPredictor.MOTORES, default='indice',
+                        help="motor de busca de vizinhos")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--porta", type=int, default=8080)
+    parser.add_argument("--k", type=int, default=5, help="K usado quando a requisição não informa")
+    parser.add_argument("--janela-ms", type=float, default=2.0,
+                        help="tempo de espera para agrupar requisições num lote")
+    parser.add_argument("--max-pendentes", type=int, default=20_000,
+                        help="perfis aguardando previsão antes de responder 503")
+    parser.add_argument("--processos", type=int, default=None,
+                        help="processos de busca do motor fragmentado (padrão: um por núcleo)")
+    parser.add_argument("--snapshot", help="pasta do snapshot do modelo (carregada se existir, gravada caso contrário)")
+    parser.add_argument("--adicionar", nargs="+", metavar="CSV",
+                        help="CSVs de outras edições acrescentados aos dados (o ano vem do nome do arquivo)")
+    parser.add_argument("--anos", type=int, nargs="+",
+                        help="edições usadas como vizinhos quando a requisição não informa")
+    parser.add_argument("--perfilar", nargs="+", metavar="ETAPA",
+                        help="etapas executadas sob cProfile e tracemalloc ('*' para todas)")
+    args = parser.parse_args()
+
+    predictor = criar_preditor(args, k=args.k)
+    if predictor is None:
+        return 1
+
+    servidor = ServidorPrevisoes(predictor, k_padrao=args.k, janela_ms=args.janela_ms,
+                                 max_pendentes=args.max_pendentes, anos_padrao=args.anos)
+    try:
+        asyncio.run(servir(servidor, args.host, args.porta))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())